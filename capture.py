@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+from timeit import default_timer as timer
+
+
+class FrameGrabber:
+
+    POLICIES = ("latest", "dropOldest", "block")
+
+    def __init__(self, cap, policy="latest", maxQueue=2):
+        """
+        FrameGrabber constructor: reads frames from a capture in a background thread, so that the consumer always gets fresh frames
+        :param cap: an opened capture (cv2.VideoCapture)
+        :param policy: what to do with frames that the consumer has not read yet:
+                       "latest" keeps only the newest frame (all stale ones are dropped),
+                       "dropOldest" keeps at most maxQueue frames, dropping the oldest ones,
+                       "block" keeps at most maxQueue frames, waiting for the consumer (no frame is dropped)
+        :param maxQueue: maximum number of buffered frames (ignored with "latest" policy)
+        """
+        assert policy in FrameGrabber.POLICIES
+        self.cap = cap
+        self.policy = policy
+        self.maxQueue = 1 if policy == "latest" else max(maxQueue, 1)
+        self.buffer = deque()   # elements are tuples (frame index, capture time, frame)
+        self.condition = threading.Condition()
+        self.running = False
+        self.ended = False
+        self.thread = None
+
+        self.grabbedFrames = 0      # frames read from the capture
+        self.droppedFrames = 0      # frames read from the capture but never returned by read()
+        self.lastIndex = -1         # index of the last returned frame
+        self.captureTime = None     # capture time (timer() clock) of the last returned frame
+        self.skippedFrames = 0      # number of frames dropped between the last two returned frames
+
+    def start(self):
+        """
+        Start the capture thread
+        :return: reference of self
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self._grab, daemon=True)
+        self.thread.start()
+        return self
+
+    def _grab(self):
+        """
+        Body of the capture thread: read frames as fast as the source produces them, applying the drop policy
+        """
+        while self.running:
+            ret, frame = self.cap.read()
+            captureTime = timer()
+            with self.condition:
+                if not ret:
+                    self.ended = True
+                    self.condition.notify_all()
+                    return
+                if self.policy == "block":
+                    while self.running and len(self.buffer) >= self.maxQueue:
+                        self.condition.wait()
+                while len(self.buffer) >= self.maxQueue:
+                    self.buffer.popleft()
+                    self.droppedFrames += 1
+                self.buffer.append((self.grabbedFrames, captureTime, frame))
+                self.grabbedFrames += 1
+                self.condition.notify_all()
+
+    def read(self):
+        """
+        Get the oldest buffered frame (i.e. the newest one, with "latest" policy), waiting for it if necessary
+        :return: a tuple (r, f) as cv2.VideoCapture.read(); r is False when the source has ended
+        """
+        with self.condition:
+            while not self.buffer and not self.ended and self.running:
+                self.condition.wait()
+            if not self.buffer:
+                return False, None
+            index, self.captureTime, frame = self.buffer.popleft()
+            self.condition.notify_all()
+        self.skippedFrames = index - self.lastIndex - 1
+        self.lastIndex = index
+        return True, frame
+
+    def latency(self):
+        """
+        Time elapsed since the capture of the last returned frame
+        :return: latency in seconds (0 if no frame has been returned yet)
+        """
+        if self.captureTime is None:
+            return 0
+        return timer() - self.captureTime
+
+    def release(self):
+        """
+        Stop the capture thread and release the capture
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.cap.release()
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+
+from preprocess import describeBackgroundSubtractor
+
+"""
+Persistent cache of the output of the object detector.
+The detections of a video depend only on the video and on the detector (background subtractor, pipeline, detection parameters), not on the tracking:
+so, when tuning the trackers, the detections of the first run can be replayed in the following ones, skipping background subtraction and pipeline.
+"""
+
+
+class DetectionCache:
+
+    def __init__(self, cacheDir="cache/detections"):
+        """
+        DetectionCache constructor
+        :param cacheDir: folder where the cached detections are stored
+        """
+        self.cacheDir = cacheDir
+
+    @staticmethod
+    def key(videoDigest, od, **settings):
+        """
+        Compute the key of the detections of a video
+        :param videoDigest: digest of the content of the video (see frame_cache.fileDigest)
+        :param od: the ObjectDetector
+        :param settings: everything else that affects the sequence of detections (frame width, flip, detection period, detect parameters, ...)
+        :return: hexadecimal key
+        """
+        description = {
+            "video": videoDigest,
+            "bgSubtractor": describeBackgroundSubtractor(od.bgSubtractor),
+            "pipeline": od.pipeline.signature(),
+            "settings": settings,
+        }
+        return hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        """
+        :param key: key of the detections
+        :return: path of the cache file
+        """
+        return os.path.join(self.cacheDir, key + ".json")
+
+    def load(self, key):
+        """
+        Load the detections of a video, if a complete sequence has been saved
+        :param key: key of the detections
+        :return: list (one element per call of detect) of lists of bounding boxes, or None if not cached
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            content = json.load(file)
+        return [[tuple(bbox) for bbox in objects] for objects in content["detections"]]
+
+    def save(self, key, detections):
+        """
+        Save the complete sequence of detections of a video
+        :param key: key of the detections
+        :param detections: list (one element per call of detect) of lists of bounding boxes
+        """
+        os.makedirs(self.cacheDir, exist_ok=True)
+        tmpPath = self.path(key) + ".tmp"
+        with open(tmpPath, "w") as file:
+            json.dump({"detections": [[[int(k) for k in bbox] for bbox in objects] for objects in detections]}, file)
+        os.replace(tmpPath, self.path(key))
+
+
+class CachedObjectDetector:
+
+    def __init__(self, od, cache, key):
+        """
+        CachedObjectDetector constructor: a detector that replays cached detections, or records the ones of the wrapped detector
+        :param od: the wrapped ObjectDetector
+        :param cache: a DetectionCache
+        :param key: key of the detections (see DetectionCache.key)
+        """
+        self.od = od
+        self.cache = cache
+        self.key = key
+        self.replayed = cache.load(key)
+        self.recorded = []
+        self.calls = 0
+
+    def isReplaying(self):
+        """
+        :return: True if the detections come from the cache
+        """
+        return self.replayed is not None
+
+    def detect(self, frame, **kwargs):
+        """
+        Same as ObjectDetector.detect; the calls must follow the same sequence of the run that filled the cache
+        :param frame: image where to search for objects
+        :param kwargs: kwargs of ObjectDetector.detect (they are part of the key, not used while replaying)
+        :return: a list of bounding boxes, each one in the form of (x,y,w,h)
+        """
+        if self.replayed is not None:
+            assert self.calls < len(self.replayed), "more detections requested than cached"
+            objects = self.replayed[self.calls]
+        else:
+            objects = self.od.detect(frame, **kwargs)
+            self.recorded.append(objects)
+        self.calls += 1
+        return objects
+
+    def updateModel(self, frame):
+        """
+        Same as ObjectDetector.updateModel; nothing is done while replaying
+        :param frame: image to learn
+        """
+        if self.replayed is None:
+            self.od.updateModel(frame)
+
+    def save(self):
+        """
+        Save the recorded detections; call it only when the video has been processed until the end, so that partial sequences are never cached
+        """
+        if self.replayed is None:
+            self.cache.save(self.key, self.recorded)
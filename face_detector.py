@@ -1,10 +1,32 @@
 import sys
 
 import cv2
+import numpy as np
 import os
 
 
+def sharpnessScores(grayFaces):
+    """
+    Variance of the Laplacian of many grayscale images, computed in one pass: the images are placed (at their own size) in a single canvas,
+    each one surrounded by its own reflected border, an integer Laplacian is computed on the whole canvas and the variances are taken on each image.
+    The result is the same as cv2.Laplacian(gray, cv2.CV_64F).var() on each image: the reflected borders are the ones of cv2.Laplacian, and for 8-bit images the 16-bit Laplacian is exact
+    :param grayFaces: list of grayscale images
+    :return: numpy array with the variance of the Laplacian of each image
+    """
+    if len(grayFaces) == 0:
+        return np.empty(0)
+    heights = [gray.shape[0] + 2 for gray in grayFaces]
+    tops = np.cumsum([0] + heights)
+    canvas = np.zeros((tops[-1], max(gray.shape[1] for gray in grayFaces) + 2), dtype=np.uint8)
+    for gray, top, height in zip(grayFaces, tops, heights):
+        canvas[top: top + height, :gray.shape[1] + 2] = cv2.copyMakeBorder(gray, 1, 1, 1, 1, cv2.BORDER_REFLECT_101)
+    laplacian = cv2.Laplacian(canvas, cv2.CV_16S)
+    return np.array([cv2.meanStdDev(laplacian[top + 1: top + 1 + gray.shape[0], 1: 1 + gray.shape[1]])[1][0, 0] ** 2 for gray, top in zip(grayFaces, tops)])
+
+
 class Face:
+    __slots__ = ("image", "score")
+
     def __init__(self, image, score):
         """
         Face constructor
@@ -38,44 +60,63 @@ class FaceDetector:
         faces_bboxes = []
         if scale is not None:
             objects_bboxes = [[int(scale*x) for x in obj] for obj in objects_bboxes]
+        facesIDs = []
+        facesImages = []
+        facesGray = []
+        facesWidths = []
         for obj_bbox, objID in zip(objects_bboxes, objectsIDs):
             if obj_bbox == [0,0,0,0]:
                 sys.stderr.write("\nempty bounding box\n")
                 continue
             (ox, oy, ow, oh) = obj_bbox
             img_obj = frame[oy:oy+oh, ox:+ox+ow]
-            faces, faces_bb = self.detectFacesInObject(img_obj)
+            images, grays, faces_bb = self._findFaces(img_obj)
 
-            if len(faces) == 0:
+            if len(faces_bb) == 0:
                 continue
 
-            if objID not in self.facesArchive:
-                self.facesArchive[objID] = []
-
-            self.facesArchive[objID].extend(faces)
+            facesIDs.extend([objID] * len(images))
+            facesImages.extend(images)
+            facesGray.extend(grays)
+            facesWidths.extend(w for (x, y, w, h) in faces_bb)
             for face_bb in faces_bb:
                 face_bb[0] += ox
                 face_bb[1] += oy
             faces_bboxes.extend(faces_bb)
 
+        # faces of all the objects are scored together
+        scores = sharpnessScores(facesGray) * np.power(np.array(facesWidths, dtype=np.float64), 1.5)
+        for objID, imgFace, score in zip(facesIDs, facesImages, scores):
+            if objID not in self.facesArchive:
+                self.facesArchive[objID] = []
+            self.facesArchive[objID].append(Face(imgFace, float(score)))
+
         return faces_bboxes
 
-    def detectFacesInObject(self, img_obj):
+    def _findFaces(self, img_obj):
         """
-        Detect faces inside a single object
+        Find the faces inside a single object, without scoring them
         :param img_obj: image of the object
-        :return: a tuple (list of faces (class Face), list of bounding boxes)
+        :return: a tuple (list of images of the faces, list of grayscale images of the faces, bounding boxes of the faces)
         """
-        faces = []
         gray = cv2.cvtColor(img_obj, cv2.COLOR_BGR2GRAY)
-
         faces_bboxes = self.frontalface_cascade.detectMultiScale(gray, 1.3, 5)
+        images = []
+        grays = []
         for (x, y, w, h) in faces_bboxes:
-            imgFace = img_obj[y: y + h, x: x + w]
-            imgFaceGray = gray[y: y + h, x: x + w]
-            score = cv2.Laplacian(imgFaceGray, cv2.CV_64F).var() * w**1.5
-            faces.append(Face(imgFace, score))
+            images.append(img_obj[y: y + h, x: x + w].copy())    # do not keep a reference to the whole frame
+            grays.append(gray[y: y + h, x: x + w])
+        return images, grays, faces_bboxes
 
+    def detectFacesInObject(self, img_obj):
+        """
+        Detect faces inside a single object
+        :param img_obj: image of the object
+        :return: a tuple (list of faces (class Face), list of bounding boxes)
+        """
+        images, grays, faces_bboxes = self._findFaces(img_obj)
+        scores = sharpnessScores(grays) * np.power(np.array([w for (x, y, w, h) in faces_bboxes], dtype=np.float64), 1.5)
+        faces = [Face(imgFace, float(score)) for imgFace, score in zip(images, scores)]
         return faces, faces_bboxes
 
     def dump(self, folder):
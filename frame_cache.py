@@ -0,0 +1,146 @@
+import hashlib
+import os
+import struct
+
+import cv2
+import imutils
+import numpy as np
+
+"""
+Cache of decoded frames: a video is decoded (and flipped/resized) only once, and its raw frames are stored in a file that later runs map in memory.
+File layout: a header of HEADER_SIZE bytes (magic, version, number of frames, height, width, channels) followed by the frames, one after the other, as uint8 BGR pixels.
+"""
+
+MAGIC = b"VTFC"
+VERSION = 1
+HEADER_FORMAT = "<4sIIIII"
+HEADER_SIZE = 64
+
+_digests = {}   # digests already computed by this process; key=(path, size, modification time); value=digest
+
+
+def fileDigest(path, chunkSize=1 << 20):
+    """
+    Compute the SHA-1 digest of the content of a file. Videos are large, so the digest is computed only once per process:
+    it is reused as long as size and modification time of the file do not change
+    :param path: path of the file
+    :param chunkSize: number of bytes read at a time
+    :return: hexadecimal digest
+    """
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunkSize), b""):
+                sha1.update(chunk)
+        _digests[key] = sha1.hexdigest()
+    return _digests[key]
+
+
+class CachedVideo:
+
+    def __init__(self, path):
+        """
+        CachedVideo constructor: map in memory a file created by FrameCache
+        :param path: path of the cache file
+        """
+        with open(path, "rb") as file:
+            magic, version, count, height, width, channels = struct.unpack(HEADER_FORMAT, file.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("'%s' is not a frame cache file" % path)
+        shape = (count, height, width, channels)
+        if count > 0:
+            self.frames = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=shape)
+        else:
+            self.frames = np.empty(shape, dtype=np.uint8)
+        self.path = path
+        self.position = 0
+
+    def __len__(self):
+        return len(self.frames) if self.frames is not None else 0
+
+    def read(self):
+        """
+        Get the next frame, as cv2.VideoCapture.read() does; the frame is a read-only view of the mapped file (no copy is made)
+        :return: a tuple (r, f); r is False when there are no more frames
+        """
+        if self.position >= len(self):
+            return False, None
+        frame = self.frames[self.position]
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        """
+        Unmap the file (as soon as no frame returned by read is referenced anymore, since they are views of the mapping)
+        """
+        self.frames = None
+
+
+class FrameCache:
+
+    def __init__(self, cacheDir="cache/frames"):
+        """
+        FrameCache constructor
+        :param cacheDir: folder where the cache files are stored
+        """
+        self.cacheDir = cacheDir
+
+    def path(self, source, width=None, flip=True):
+        """
+        Get the path of the cache file of a video; the key is given by the content of the video and by the settings
+        :param source: path of the video file
+        :param width: width of the cached frames (if None, the original one)
+        :param flip: True if the frames are horizontally flipped
+        :return: path of the cache file
+        """
+        key = "%s_w%s_f%d" % (fileDigest(source), "orig" if width is None else str(width), int(flip))
+        return os.path.join(self.cacheDir, key + ".frames")
+
+    def open(self, source, width=None, flip=True):
+        """
+        Open a video from the cache, decoding it first if it is not already cached
+        :param source: path of the video file
+        :param width: width of the frames (if None, the original one)
+        :param flip: True to flip horizontally the frames
+        :return: a CachedVideo, usable in place of a cv2.VideoCapture
+        """
+        path = self.path(source, width, flip)
+        if not os.path.exists(path):
+            self.build(source, path, width, flip)
+        return CachedVideo(path)
+
+    def build(self, source, path, width=None, flip=True):
+        """
+        Decode a video and write its frames in a cache file
+        :param source: path of the video file
+        :param path: path of the cache file
+        :param width: width of the frames (if None, the original one)
+        :param flip: True to flip horizontally the frames
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmpPath = path + ".tmp"
+        cap = cv2.VideoCapture(source)
+        count = 0
+        shape = (0, 0, 0)
+        with open(tmpPath, "wb") as file:
+            file.write(bytes(HEADER_SIZE))
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if flip:
+                    frame = cv2.flip(frame, 1)
+                if width is not None:
+                    frame = imutils.resize(frame, width=width)
+                if count == 0:
+                    shape = frame.shape
+                elif frame.shape != shape:
+                    raise ValueError("frames of '%s' have different shapes" % source)
+                file.write(np.ascontiguousarray(frame).tobytes())
+                count += 1
+            file.seek(0)
+            file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, count, *shape))
+        cap.release()
+        os.replace(tmpPath, path)   # the cache file appears only when complete
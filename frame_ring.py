@@ -0,0 +1,65 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+
+    ALIGNMENT = 64
+
+    def __init__(self, numSlots, fields, name=None):
+        """
+        SharedFrameRing constructor: a ring of slots allocated in a single shared memory block, each slot holds one array per field
+        :param numSlots: number of slots of the ring
+        :param fields: dictionary with the layout of a slot; key=field name; value=tuple (shape, dtype) of the field's array
+        :param name: name of an existing shared memory block to attach to; if None, a new block is created (and the creating process owns it)
+        """
+        self.numSlots = numSlots
+        self.fields = {field: (tuple(shape), np.dtype(dtype).str) for field, (shape, dtype) in fields.items()}
+
+        self.offsets = {}
+        slotSize = 0
+        for field, (shape, dtype) in self.fields.items():
+            self.offsets[field] = slotSize
+            slotSize += int(np.prod(shape)) * np.dtype(dtype).itemsize
+            slotSize += -slotSize % SharedFrameRing.ALIGNMENT   # keep every array aligned
+        self.slotSize = slotSize
+
+        # only the process that created the block may destroy it: a forked child inherits this object as it is, so ownership is bound to the process id
+        self.ownerPid = os.getpid() if name is None else None
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(slotSize * numSlots, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.views = []
+        for slot in range(numSlots):
+            self.views.append({
+                field: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * slotSize + self.offsets[field])
+                for field, (shape, dtype) in self.fields.items()
+            })
+
+    def __reduce__(self):
+        """
+        When sent to another process, the ring is re-attached to the same shared memory block (no data is copied)
+        """
+        return SharedFrameRing, (self.numSlots, self.fields, self.shm.name)
+
+    def view(self, slot, field):
+        """
+        Get the array of a field of a slot; it is a view on the shared memory, so writes are visible to the other processes
+        :param slot: index of the slot
+        :param field: name of the field
+        :return: numpy array backed by the shared memory
+        """
+        return self.views[slot][field]
+
+    def close(self):
+        """
+        Detach from the shared memory block, and destroy it if the calling process created it. No view can be used after this call
+        """
+        self.views = []
+        self.shm.close()
+        if self.ownerPid == os.getpid():
+            self.shm.unlink()
@@ -1,6 +1,7 @@
 import cv2
 import imutils
 
+from frame_cache import FrameCache
 from object_detector import ObjectDetector
 from preprocess import CompositeBackgroundSubtractor, ProcessPipeline
 from utils import mergeImgs, draw_bboxes, fillHoles
@@ -18,7 +19,12 @@ def main():
     #captureSource = 'video/video_116.mp4'
     #captureSource = 'video/video_205.mp4'
     captureSource = 'video/video_white.mp4'
-    cap = cv2.VideoCapture(captureSource)
+    useFrameCache = captureSource != 0    # video files are decoded only once, later runs read the frames from a memory-mapped file
+    frameWidth = 512
+    if useFrameCache:
+        cap = FrameCache().open(captureSource, width=frameWidth, flip=True)
+    else:
+        cap = cv2.VideoCapture(captureSource)
 
     ''' some background subtractor with default params '''
     # bgSubtractor = cv2.bgsegm.createBackgroundSubtractorMOG(history=200, nmixtures=5, backgroundRatio=0.7, noiseSigma=0)
@@ -75,8 +81,9 @@ def main():
         ret, frame = cap.read()
         if not ret:
             break
-        frame = imutils.resize(frame, width=512)
-        frame = cv2.flip(frame, 1)
+        if not useFrameCache:
+            frame = imutils.resize(frame, width=frameWidth)
+            frame = cv2.flip(frame, 1)
 
         ''' detection '''
         color = (255,0,0)   # blue
@@ -0,0 +1,43 @@
+from stream_engine import Stream, StreamEngine
+from main_tracking import createBackgroundSubtractor, createPipeline
+
+"""
+Many input streams are served at the same time by a pool of workers: each stream has its own detector, trackers and faces archive.
+Here the videos of the repository stand in for cameras; the faces of each stream are saved in its own output folder.
+"""
+
+
+def main():
+    ''' input streams '''
+    # choose the input streams: (name, source)
+    captureSources = [
+        ("video_116", "video/video_116.mp4"),
+        ("video_205", "video/video_205.mp4"),
+        ("video_white", "video/video_white.mp4"),
+        # ("webcam", 0),
+    ]
+
+    ''' parameters '''
+    trackerName = "CSRT"    # "MOSSE" | "KCF" | "CSRT"
+    workers = None          # size of the pool (None: number of cores)
+    mode = "thread"         # "thread" | "process"
+
+    ''' engine '''
+    # background subtractor and pipeline are the ones of main_tracking.py
+    streams = [Stream(name, source, createBackgroundSubtractor, createPipeline, trackerName=trackerName, outputDir="output/streams")
+               for name, source in captureSources]
+    engine = StreamEngine(streams, workers=workers, mode=mode)
+    print("Serving %d streams with %s pool" % (len(streams), mode))
+    stats, seconds = engine.run()
+
+    ''' some stats '''
+    totalFrames = 0
+    for s in stats:
+        fps = s["frames"] / s["seconds"] if s["seconds"] > 0 else 0
+        print("%-15s frames: %05d    busy FPS: %03d%s" % (s["name"], s["frames"], int(fps), "    stopped by " + s["error"] if s["error"] is not None else ""))
+        totalFrames += s["frames"]
+    print("Total throughput: %.2f FPS" % (totalFrames / seconds if seconds > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import cv2
+
+from preprocess import ProcessPipeline
+from sweep import ParameterSweep, printResults, writeResults
+from utils import fillHoles
+
+"""
+Compare many background subtractors, parameters and pipelines on the same video, evaluating them in parallel.
+For each configuration are reported throughput, detection statistics and, if reference masks are given, the agreement (IoU) with them.
+"""
+
+
+def main():
+    ''' input '''
+    # choose the input video
+    #captureSource = 'video/video_116.mp4'
+    #captureSource = 'video/video_205.mp4'
+    captureSource = 'video/video_white.mp4'
+    referenceDir = None     # folder with reference masks named "%05d.png" % frameNumber (None if there are not)
+
+    ''' grid of background subtractors '''
+    bgSubtractorSpecs = [
+        ("MOG2", dict(history=history, varThreshold=varThreshold, detectShadows=True))
+        for history in (200, 500) for varThreshold in (14, 25)
+    ] + [
+        ("KNN", dict(history=500, dist2Threshold=dist2Threshold, detectShadows=True))
+        for dist2Threshold in (400.0, 500.0)
+    ] + [
+        ("Composite", [("MOG", dict(history=600, nmixtures=3, backgroundRatio=0.2, noiseSigma=2.3)),
+                       ("MOG2", dict(history=200, varThreshold=14, detectShadows=True))]),
+    ]
+
+    ''' grid of pipelines '''
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+    pipelines = {"none": ProcessPipeline()}
+    for dilations in (3, 5):
+        pipeline = ProcessPipeline().add(cv2.medianBlur, ksize=5)
+        for i in range(dilations):
+            pipeline.add(cv2.dilate, kernel=kernel)
+        pipeline.add(fillHoles).add(cv2.erode, kernel=kernel).add(cv2.erode, kernel=kernel)
+        pipelines["dilate x%d" % dilations] = pipeline
+
+    ''' sweep '''
+    sweep = ParameterSweep(captureSource, frameWidth=512, referenceDir=referenceDir)
+    configs = sweep.grid(bgSubtractorSpecs, pipelines, minAreas=(0.05, 0.1))
+    print("Evaluating %d configurations on '%s' with %d workers" % (len(configs), captureSource, sweep.workers))
+    results = sweep.run(configs)
+
+    ''' results '''
+    printResults(results)
+    outputFile = "output/sweep/" + captureSource[captureSource.rfind("/")+1:captureSource.rfind(".")] + ".csv"
+    writeResults(results, outputFile)
+    print("Results saved in '%s'" % outputFile)
+
+
+if __name__ == "__main__":
+    main()
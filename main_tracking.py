@@ -3,11 +3,17 @@ import os
 import imutils
 from timeit import default_timer as timer
 
+from capture import FrameGrabber
 from object_detector import ObjectDetector
+from detection_cache import DetectionCache, CachedObjectDetector
 from face_detector import FaceDetector
-from preprocess import ProcessPipeline, CompositeBackgroundSubtractor
+from frame_cache import FrameCache, fileDigest
+from motion_gate import MotionGate
+from preprocess import ProcessPipeline, CompositeBackgroundSubtractor, RegionMask
+from stage_pipeline import StagePipeline
 from tracker import TrackerManager
 from utils import fillHoles, draw_bboxes
+from video_writer import AsyncVideoWriter
 
 """
 Given an input stream, we combine object detection via background subtraction and a tracking algorithm in order to identify people that appear in the video.
@@ -16,26 +22,11 @@ Changing the video stream, the background subtractor, the pipeline steps, the tr
 """
 
 
-def main():
-    ''' input '''
-    # choose the input stream
-    #captureSource = "video/video_116.mp4"
-    #captureSource = "video/video_205.mp4"
-    captureSource = "video/video_white.mp4"
-    #captureSource = 0  # webcam
-    cap = cv2.VideoCapture(captureSource)
-
-    ''' trackers typology '''
-    # choose the tracker
-    trackerName = "CSRT"  # "MOSSE" | "KCF" | "CSRT"
-    tm = TrackerManager(trackerName, maxFailures=20)
-
-    ''' parameters '''
-    # try to change these parameters
-    period = 1                  # length of the period: only on the first frame of the period we detect objects (instead, we track them in every frame)
-    maintainDetected = True     # True if in transition frames, in case of overlapping bboxes,  we want to keep those of the detector (False if we want to keep those of the tracker)
-    frameWidth = 512
-
+def createBackgroundSubtractor():
+    """
+    Create the background subtractor used for object detection (module level, so that it can be called by other processes too)
+    :return: a background subtractor algorithm
+    """
     ''' some background subtractor with default params '''
     # bgSubtractor = cv2.bgsegm.createBackgroundSubtractorMOG(history=200, nmixtures=5, backgroundRatio=0.7, noiseSigma=0)
     # bgSubtractor = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16,	detectShadows=True)
@@ -50,7 +41,14 @@ def main():
     # bgSubtractor = CompositeBackgroundSubtractor(
     #     cv2.bgsegm.createBackgroundSubtractorMOG(history=600, nmixtures=3, backgroundRatio=0.2, noiseSigma=2.3),
     #     cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=14, detectShadows=True)) # good for video/video_white.mp4
+    return bgSubtractor
+
 
+def createPipeline():
+    """
+    Create the pipeline of functions applied to the b/w mask (module level, so that it can be called by other processes too)
+    :return: a ProcessPipeline object
+    """
     ''' pipeline '''
     # define the pipeline of functions to be executed on the b/w image, after the background subtraction and before getting bounding rects of contours
     kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
@@ -64,12 +62,85 @@ def main():
         .add(cv2.dilate, kernel=kernel) \
         .add(fillHoles) \
         .add(cv2.erode, kernel=kernel) \
-        .add(cv2.erode, kernel=kernel) \
+        .add(cv2.erode, kernel=kernel)
+    return pipeline
+
+
+def main():
+    ''' input '''
+    # choose the input stream
+    #captureSource = "video/video_116.mp4"
+    #captureSource = "video/video_205.mp4"
+    captureSource = "video/video_white.mp4"
+    #captureSource = 0  # webcam
+
+    ''' real-time mode '''
+    # with live sources, frames are grabbed in background and the stale ones are dropped, so that latency stays bounded
+    realTime = captureSource == 0
+    dropPolicy = "latest"       # "latest" | "dropOldest" | "block" (see FrameGrabber)
+
+    ''' trackers typology '''
+    # choose the tracker
+    trackerName = "CSRT"  # "MOSSE" | "KCF" | "CSRT"
+    tm = TrackerManager(trackerName, maxFailures=20)
+
+    ''' parameters '''
+    # try to change these parameters
+    period = 1                  # length of the period: only on the first frame of the period we detect objects (instead, we track them in every frame)
+    maintainDetected = True     # True if in transition frames, in case of overlapping bboxes,  we want to keep those of the detector (False if we want to keep those of the tracker)
+    frameWidth = 512
+    multiProcess = False        # True to run decoding, detection, tracking and face detection in separate processes (see StagePipeline)
+    motionGate = None           # MotionGate() to skip detection, tracking and face search on frames where nothing has changed
+    bgUpdatePeriod = 10         # on consecutive skipped frames, the background model is updated once every bgUpdatePeriod frames
+
+    ''' output '''
+    showWindow = True           # False for headless runs
+    saveVideo = False           # True to save the annotated frames in a video (encoded by a dedicated thread, see AsyncVideoWriter)
+    outputVideoSize = None      # size (width, height) of the saved video (None: size of the input frames)
+    outputVideoSkip = 1         # one frame every outputVideoSkip frames is saved
+    outputVideoFPS = None       # frame rate of the saved video, before the frame skip (None: frame rate of the input stream)
+
+    ''' region of interest '''
+    # parts of the scene that never contain people (ceilings, monitors, windows) can be excluded from detection, in coordinates of the resized frame, e.g.:
+    # regionMask = RegionMask(includePolygons=[[(0, 60), (511, 60), (511, 383), (0, 383)]], excludePolygons=[[(400, 60), (511, 60), (511, 200), (400, 200)]])
+    regionMask = None
+
+    ''' multi-process mode '''
+    # the stage processes implement detection (also with a region of interest), tracking and face detection, not the other features
+    if multiProcess:
+        unsupported = [name for name, enabled in [("live sources", realTime), ("motionGate", motionGate is not None), ("saveVideo", saveVideo)] if enabled]
+        if unsupported:
+            print("multiProcess can not be used with: " + ", ".join(unsupported))
+            exit(1)
 
     ''' create object detector and face detector '''
-    od = ObjectDetector(bgSubtractor, pipeline)
+    # background subtractor and pipeline are defined in createBackgroundSubtractor() and createPipeline()
+    bgSubtractor = createBackgroundSubtractor()
+    od = ObjectDetector(bgSubtractor, createPipeline(), regionMask=regionMask)
     fd = FaceDetector()
 
+    ''' warm start of the background model '''
+    # background frames are saved periodically and at the end, and at startup they are given to the background subtractor, which then converges in a few frames
+    # (enabled by default with live sources only, so that experiments on video files start from the same state)
+    warmStart = realTime
+    if warmStart:
+        checkpointName = "webcam" if captureSource == 0 else os.path.basename(captureSource)
+        od.enableCheckpoints(os.path.join("cache", "checkpoints", checkpointName + ".npz"))
+        if od.restoreCheckpoint():     # validated against the size of the frames (and restored, or dropped) on the first frame
+            print("Background model checkpoint loaded from '%s'" % od.checkpointFile)
+
+    ''' detection cache '''
+    # detections do not depend on tracking parameters: once a video has been processed until the end, its detections are replayed in the following runs
+    useDetectionCache = not realTime and not multiProcess     # the stage processes run their own detector
+    detector = od
+    if useDetectionCache:
+        key = DetectionCache.key(fileDigest(captureSource), od, frameWidth=frameWidth, flip=True, period=period,
+                                 motionGate=motionGate.signature() if motionGate is not None else None, bgUpdatePeriod=bgUpdatePeriod,
+                                 regionMask=regionMask.signature() if regionMask is not None else None, warmStart=od.restoredDigest)
+        detector = CachedObjectDetector(od, DetectionCache(), key)
+        if detector.isReplaying():
+            print("Replaying detections from cache")
+
     ''' auto-definition of output folder '''
     outputDir = "output"
     if captureSource == 0:
@@ -79,18 +150,49 @@ def main():
     outputDir = os.path.join(outputDir, trackerName)
     print("Tracking video '%s' with tracker %s" % (captureSource, trackerName))
 
+    if multiProcess:
+        stages = StagePipeline(captureSource, trackerName, createBackgroundSubtractor, createPipeline,
+                               frameWidth=frameWidth, period=period, maintainDetected=maintainDetected, maxFailures=tm.maxFailures,
+                               regionMask=regionMask)
+        frameNumber, totalTime = stages.run(outputDir, show=showWindow)
+        avgFPS = str(round(frameNumber / totalTime, 2)) if totalTime > 0 else "0"
+        print("\rAverage FPS: " + avgFPS)
+        writeInfo(outputDir, trackerName, bgSubtractor, avgFPS, {"stages": "multi-process"})
+        return
+
+    ''' frame cache '''
+    # video files are decoded only once: the following runs read the (already flipped) frames from a memory-mapped file
+    useFrameCache = not realTime
+
+    if realTime:
+        cap = FrameGrabber(cv2.VideoCapture(captureSource), policy=dropPolicy).start()
+    elif useFrameCache:
+        cap = FrameCache().open(captureSource, flip=True)
+    else:
+        cap = cv2.VideoCapture(captureSource)
+
+    if saveVideo and outputVideoFPS is None:
+        sourceCap = cap.cap if realTime else cv2.VideoCapture(captureSource)
+        outputVideoFPS = sourceCap.get(cv2.CAP_PROP_FPS) or 25      # 25 if the stream does not report its frame rate
+        if not realTime:
+            sourceCap.release()
+
     ''' cycle begins '''
     frameNumber = 0
     frames = 0
     seconds = 0
     eta = 0.05
     totalTime = 0
+    latency = 0
+    videoEnded = False
+    faces_bboxes = []
+    videoWriter = None
     show = True
     oneSkipOnly = False
     while True:
 
         ''' handle input: esc to quit; space to pause/start; "n" to go one frame at a time '''
-        k = cv2.waitKey(30) & 0xff
+        k = cv2.waitKey(1 if realTime else 30) & 0xff if showWindow else -1
         if k == 27:
             break
         elif k == ord(' ') or oneSkipOnly:
@@ -108,19 +210,29 @@ def main():
         ''' reading next frame '''
         ret, frameOrig = cap.read()
         if not ret:
+            videoEnded = True
             break
-        frameOrig = cv2.flip(frameOrig, 1)
+        skippedFrames = cap.skippedFrames if realTime else 0
+        if not useFrameCache:
+            frameOrig = cv2.flip(frameOrig, 1)
         frame = imutils.resize(frameOrig, width=frameWidth)
         scale = frameOrig.shape[1] / frameWidth
 
-        detectedObjects = []
-        if frameNumber % period == 0:
-            ''' detection by background subtraction '''
-            detectedObjects = od.detect(frame)
-            ''' objects tracking, faces detection'''
+        changed = motionGate is None or motionGate.changed(frame)
+        if changed:
+            detectedObjects = []
+            if frameNumber % period == 0:
+                ''' detection by background subtraction '''
+                detectedObjects = detector.detect(frame)
+                ''' objects tracking, faces detection'''
 
-        ''' tracking '''
-        success, objects = tm.update(frame, detectedObjects, maintainDetected=maintainDetected)
+            ''' tracking '''
+            success, objects = tm.update(frame, detectedObjects, maintainDetected=maintainDetected, skippedFrames=skippedFrames)
+        else:
+            ''' nothing has changed: trackers only age, and the background model keeps learning from time to time '''
+            if motionGate.staticFrames % bgUpdatePeriod == 0:
+                detector.updateModel(frame)
+            success, objects = tm.age(skippedFrames + 1)
         objIDs = tm.getIDs()
         tm.removeDeadTrackers()
 
@@ -130,38 +242,82 @@ def main():
         objects = [obj for suc, obj in zip(success, objects) if suc]
 
         ''' detection of faces '''
-        faces_bboxes = fd.detectFaces(frameOrig, objects, objIDs, scale=scale)
+        if changed:
+            faces_bboxes = fd.detectFaces(frameOrig, objects, objIDs, scale=scale)
 
         ''' images merging and show '''
         frameOrig = draw_bboxes(frameOrig, objects, (255,0,0), succ_objIDs, scale=scale)
         frameOrig = draw_bboxes(frameOrig, failed_objects, (0,0,255), failed_objIDs, scale=scale)
         frameOrig = draw_bboxes(frameOrig, faces_bboxes, (0,255,0))
-        frameOrig = cv2.resize(frameOrig, (640, 640))
-        cv2.imshow('frame', frameOrig)
+        if saveVideo and frameNumber % outputVideoSkip == 0:
+            if videoWriter is None:
+                os.makedirs(outputDir, exist_ok=True)
+                size = outputVideoSize if outputVideoSize is not None else (frameOrig.shape[1], frameOrig.shape[0])
+                videoWriter = AsyncVideoWriter(os.path.join(outputDir, "annotated.avi"), cv2.VideoWriter_fourcc(*'XVID'),
+                                               outputVideoFPS / outputVideoSkip, size, maxQueue=32)
+            videoWriter.write(frameOrig)    # resized and encoded by the writer thread
+        if showWindow:
+            frameOrig = cv2.resize(frameOrig, (640, 640))
+            cv2.imshow('frame', frameOrig)
 
         ''' some stats '''
         frameNumber += 1
         end = timer()
         frames = eta + (1-eta)*frames
         seconds = eta * (end-start) + (1-eta)*seconds
-        print("\rFrame: %04d    FPS: %03d   Active trackers: %02d    Failed trackers: %02d           " %
-              (frameNumber, int(frames // seconds), len(objects), len(failed_objects)), end="")
+        if realTime:
+            latency = eta * cap.latency() + (1-eta)*latency
+            print("\rFrame: %04d    FPS: %03d   Active trackers: %02d    Failed trackers: %02d    Dropped: %04d    Latency: %03d ms    " %
+                  (frameNumber, int(frames // seconds), len(objects), len(failed_objects), cap.droppedFrames, int(latency*1000)), end="")
+        else:
+            print("\rFrame: %04d    FPS: %03d   Active trackers: %02d    Failed trackers: %02d           " %
+                  (frameNumber, int(frames // seconds), len(objects), len(failed_objects)), end="")
         totalTime += end - start
 
     cap.release()
-    cv2.destroyAllWindows()
+    if videoWriter is not None:
+        videoWriter.release()
+    if showWindow:
+        cv2.destroyAllWindows()     # headless builds of OpenCV have no windows to destroy (and raise an error)
 
     ''' save on disk '''
     fd.dump(outputDir)
+    if useDetectionCache and videoEnded:
+        detector.save()
+    if warmStart:
+        od.saveCheckpoint()
 
     avgFPS = str(round(frameNumber / totalTime, 2))
     print("\rAverage FPS: " + avgFPS)
+    extraInfo = {}
+    if videoWriter is not None:
+        extraInfo["saved video frames"] = videoWriter.writtenFrames
+    if realTime:
+        extraInfo["dropped frames"] = cap.droppedFrames
+        extraInfo["average latency (ms)"] = int(latency*1000)
+    if motionGate is not None:
+        extraInfo["static frames"] = motionGate.skippedFrames
+    writeInfo(outputDir, trackerName, bgSubtractor, avgFPS, extraInfo)
+
+
+def writeInfo(outputDir, trackerName, bgSubtractor, avgFPS, extraInfo):
+    """
+    Write a summary of the run in the file info.txt of the output folder
+    :param outputDir: output folder
+    :param trackerName: name of the used tracker
+    :param bgSubtractor: the used background subtractor
+    :param avgFPS: average FPS, as a string
+    :param extraInfo: dictionary of further lines to write; key=description; value=value
+    """
+    os.makedirs(outputDir, exist_ok=True)
     with open(os.path.join(outputDir, "info.txt"), "w") as file:
         bgSubClsName = str(bgSubtractor.__class__)
         bgSubClsName = bgSubClsName[bgSubClsName.index("'") + 1: bgSubClsName.rindex("'")]
         file.write("tracker: " + trackerName + "\n")
         file.write("background subtractor: " + bgSubClsName + "\n")
         file.write("average FPS: " + avgFPS + "\n")
+        for description, value in extraInfo.items():
+            file.write(description + ": " + str(value) + "\n")
 
 
 if __name__ == "__main__":
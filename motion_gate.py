@@ -0,0 +1,41 @@
+import cv2
+
+
+class MotionGate:
+
+    def __init__(self, thumbnailSize=(32, 24), threshold=12, maxStaticFrames=50):
+        """
+        MotionGate constructor: a cheap change detector, that compares tiny grayscale thumbnails of the frames
+        :param thumbnailSize: size (width, height) of the thumbnails
+        :param threshold: minimum absolute difference (in gray levels) of at least one thumbnail pixel to consider the frame changed
+        :param maxStaticFrames: maximum number of consecutive frames considered static, after which a frame is considered changed anyway (0 for no limit)
+        """
+        self.thumbnailSize = thumbnailSize
+        self.threshold = threshold
+        self.maxStaticFrames = maxStaticFrames
+        self.reference = None       # thumbnail of the last changed frame
+        self.staticFrames = 0       # number of consecutive static frames
+        self.skippedFrames = 0      # total number of static frames
+
+    def changed(self, frame):
+        """
+        Check if a frame has changed w.r.t. the last changed frame (so a slow drift is detected too, once it is large enough)
+        :param frame: BGR image
+        :return: True if the frame has changed, False if nothing happened
+        """
+        thumbnail = cv2.cvtColor(cv2.resize(frame, self.thumbnailSize, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if self.reference is not None and (self.maxStaticFrames <= 0 or self.staticFrames < self.maxStaticFrames):
+            maxDiff = cv2.minMaxLoc(cv2.absdiff(thumbnail, self.reference))[1]
+            if maxDiff < self.threshold:
+                self.staticFrames += 1
+                self.skippedFrames += 1
+                return False
+        self.reference = thumbnail
+        self.staticFrames = 0
+        return True
+
+    def signature(self):
+        """
+        :return: the parameters of the gate, as a dictionary (they affect the sequence of detections)
+        """
+        return {"thumbnailSize": list(self.thumbnailSize), "threshold": self.threshold, "maxStaticFrames": self.maxStaticFrames}
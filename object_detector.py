@@ -1,18 +1,49 @@
 import copy
+import hashlib
+import json
+import os
+import threading
+from collections import deque
 
 import cv2
+import numpy as np
+
+from preprocess import describeBackgroundSubtractor
 
 
 class ObjectDetector:
 
-    def __init__(self, bgSubtractor, processPipeline):
+    def __init__(self, bgSubtractor, processPipeline, regionMask=None):
         """
         ObjectDetector constructor
         :param bgSubtractor: a background subtractor algorithm (cv2.BackgroundSubtractor)
         :param processPipeline: a ProcessPipeline objects, which specifies processing steps to apply after the background subtraction and before bounding boxes creation
+        :param regionMask: a RegionMask object; if given, background subtraction and pipeline process only the bounding rect of its active region, and objects are searched only inside it
         """
         self.bgSubtractor = bgSubtractor
         self.pipeline = copy.deepcopy(processPipeline)
+        self.regionMask = regionMask
+
+        self.checkpointFile = None
+        self.checkpointInterval = 0
+        self.sampleInterval = 1
+        self.samples = deque()      # recent background frames (cropped), replayed to warm start the background model
+        self.learnedFrames = 0      # number of frames given to the background subtractor
+        self.lastObjects = 0        # number of objects found by the last detection
+        self.checkpointThread = None    # thread writing the last periodic checkpoint
+        self.restoredDigest = None  # digest of the checkpoint restored at startup (None if the model started cold)
+        self.pendingCheckpoint = None   # checkpoint loaded by restoreCheckpoint, waiting for the first frame to be validated against its shape
+
+    def _crop(self, frame):
+        """
+        Crop the frame to the bounding rect of the region of interest
+        :param frame: whole frame
+        :return: a tuple (cropped frame, (x, y) offset of the crop)
+        """
+        if self.regionMask is None:
+            return frame, (0, 0)
+        x, y, w, h = self.regionMask.build(frame.shape)
+        return frame[y:y+h, x:x+w], (x, y)
 
     def detect(self, frame, minArea=0.1, maxArea=0.5):
         """
@@ -23,12 +54,19 @@ class ObjectDetector:
         :return: a list of bounding boxes, each one in the form of (x,y,w,h)
         """
         frameArea = frame.shape[0] * frame.shape[1]
+        frame, offset = self._crop(frame)
+        if frame.size == 0:     # empty region of interest
+            return []
+        if self.pendingCheckpoint is not None:
+            self._applyCheckpoint(frame.shape)
         fgmask = self.bgSubtractor.apply(frame)     # apply background subtractor
         fgmask[fgmask != 255] = 0   # remove grays
+        if self.regionMask is not None:
+            self.regionMask.apply(fgmask)   # remove excluded pixels
         fgmask = self.pipeline.process(fgmask)  # apply pipeline processing steps
 
         objects = []
-        contours, hierarchy = cv2.findContours(fgmask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        contours, hierarchy = cv2.findContours(fgmask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
         for i, contour in enumerate(contours):
             x, y, w, h = cv2.boundingRect(contour)
             area = w*h
@@ -36,4 +74,130 @@ class ObjectDetector:
             if minArea * frameArea <= area <= maxArea * frameArea and hierarchy[0][i][3] == -1:
                 objects.append((x, y, w, h))
 
+        self.lastObjects = len(objects)
+        self._learned(frame, isBackground=len(objects) == 0)
         return objects
+
+    def updateModel(self, frame):
+        """
+        Update the background model with a frame, without detecting objects (useful on frames where detection is skipped, so that the model does not become stale)
+        The frame is sampled for the checkpoints only if the last detection found no objects (a frame can be static because a person is standing still)
+        :param frame: image to learn
+        """
+        frame, _ = self._crop(frame)
+        if frame.size > 0:
+            if self.pendingCheckpoint is not None:
+                self._applyCheckpoint(frame.shape)
+            self.bgSubtractor.apply(frame)
+            self._learned(frame, isBackground=self.lastObjects == 0)
+
+    def enableCheckpoints(self, checkpointFile, checkpointInterval=500, numSamples=60, sampleInterval=5):
+        """
+        Periodically save on disk what is needed to warm start the background model.
+        OpenCV background subtractors can not save their model (only their parameters), so a set of recent frames without objects is saved instead,
+        and at restore it is given to the background subtractor (also a CompositeBackgroundSubtractor), which in this way converges in a few frames.
+        :param checkpointFile: path of the checkpoint file (.npz)
+        :param checkpointInterval: a checkpoint is saved every checkpointInterval learned frames (0 to save only when saveCheckpoint is called)
+        :param numSamples: number of background frames kept in the checkpoint
+        :param sampleInterval: a background frame is sampled every sampleInterval learned frames
+        """
+        self.checkpointFile = checkpointFile
+        self.checkpointInterval = checkpointInterval
+        self.sampleInterval = max(sampleInterval, 1)
+        self.samples = deque(self.samples, maxlen=numSamples)
+
+    def _learned(self, frame, isBackground):
+        """
+        Bookkeeping after a frame has been given to the background subtractor: sampling of background frames and periodic checkpoints
+        :param frame: the (cropped) frame given to the background subtractor
+        :param isBackground: True if no object has been found in the frame
+        """
+        self.learnedFrames += 1
+        if self.checkpointFile is None:
+            return
+        if isBackground and self.learnedFrames % self.sampleInterval == 0:
+            self.samples.append(frame.copy())
+        if self.checkpointInterval > 0 and self.learnedFrames % self.checkpointInterval == 0:
+            self.saveCheckpoint(background=True)     # tens of MB to write: not on the processing thread
+
+    def _checkpointSignature(self, frameShape):
+        """
+        Description of what a checkpoint can be restored into: same background subtractor (type and parameters), same region of interest and same frames shape
+        :param frameShape: shape of the (cropped) frames
+        :return: a JSON string
+        """
+        return json.dumps({"bgSubtractor": describeBackgroundSubtractor(self.bgSubtractor),
+                           "regionMask": self.regionMask.signature() if self.regionMask is not None else None,
+                           "frameShape": list(frameShape)}, sort_keys=True)
+
+    def saveCheckpoint(self, background=False):
+        """
+        Save the sampled background frames in the checkpoint file (if there are any)
+        :param background: True to write the file in a background thread; if the previous background write is still running, this checkpoint is skipped
+        :return: True if the checkpoint has been saved (or its writing has started)
+        """
+        if self.checkpointFile is None or len(self.samples) == 0:
+            return False
+        if self.checkpointThread is not None:
+            if background and self.checkpointThread.is_alive():
+                return False
+            self.checkpointThread.join()    # the last checkpoint must be the most recent one
+            self.checkpointThread = None
+        samples = list(self.samples)    # sampled frames are never modified, so a list of them is a consistent snapshot
+        signature = self._checkpointSignature(samples[0].shape)
+        if background:
+            self.checkpointThread = threading.Thread(target=self._writeCheckpoint, args=(samples, signature), daemon=True)
+            self.checkpointThread.start()
+        else:
+            self._writeCheckpoint(samples, signature)
+        return True
+
+    def _writeCheckpoint(self, samples, signature):
+        """
+        Write a checkpoint file (atomically: a checkpoint interrupted while writing does not replace the previous one)
+        :param samples: list of background frames
+        :param signature: signature of the checkpoint (see _checkpointSignature)
+        """
+        if os.path.dirname(self.checkpointFile):
+            os.makedirs(os.path.dirname(self.checkpointFile), exist_ok=True)
+        tmpFile = self.checkpointFile + ".tmp.npz"
+        np.savez(tmpFile, samples=np.stack(samples), signature=signature)
+        os.replace(tmpFile, self.checkpointFile)
+
+    def restoreCheckpoint(self, frameShape=None):
+        """
+        Warm start the background model from the checkpoint file, if it exists and matches this detector.
+        The checkpoint is validated against the shape of the frames that the background subtractor will actually receive:
+        if frameShape is not given, the checkpoint is kept pending and validated (then restored or dropped) on the first frame given to detect or updateModel
+        :param frameShape: shape of the whole frames that will be processed (None if not known yet)
+        :return: True if the background model has been restored (or is going to be restored on the first frame, if frameShape is None)
+        """
+        if self.checkpointFile is None or not os.path.exists(self.checkpointFile):
+            return False
+        with np.load(self.checkpointFile) as checkpoint:
+            samples = checkpoint["samples"]
+            signature = str(checkpoint["signature"])
+        with open(self.checkpointFile, "rb") as file:
+            digest = hashlib.sha1(file.read()).hexdigest()
+        self.pendingCheckpoint = (samples, signature, digest)
+        self.restoredDigest = digest
+        if frameShape is None:
+            return True
+        cropShape = self._crop(np.empty(frameShape, dtype=np.uint8))[0].shape
+        return self._applyCheckpoint(cropShape)
+
+    def _applyCheckpoint(self, frameShape):
+        """
+        Restore the pending checkpoint if it has been saved with the same background subtractor, region of interest and frames shape, otherwise drop it
+        :param frameShape: shape of the (cropped) frames given to the background subtractor
+        :return: True if the background model has been restored
+        """
+        samples, signature, digest = self.pendingCheckpoint
+        self.pendingCheckpoint = None
+        if signature != self._checkpointSignature(frameShape) or samples.shape[1:] != tuple(frameShape):
+            self.restoredDigest = None  # different background subtractor, region of interest or frame size: the model starts cold
+            return False
+        for sample in samples:
+            self.bgSubtractor.apply(sample)
+            self.samples.append(sample)
+        return True
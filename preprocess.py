@@ -1,3 +1,5 @@
+import hashlib
+
 import cv2
 import numpy as np
 
@@ -49,6 +51,25 @@ class ProcessPipeline:
 
         return self.intermediateOutputs[-1]
 
+    def signature(self):
+        """
+        Description of the functions in the pipeline and of their parameters, which identifies the processing made by the pipeline
+        :return: a list of [function name, {parameter: value}] (JSON serializable)
+        """
+        steps = []
+        for function, kwargs in zip(self.functions, self.params):
+            name = getattr(function, "__module__", None) or ""
+            name += "." + getattr(function, "__qualname__", getattr(function, "__name__", repr(function)))
+            params = {}
+            for k, v in sorted(kwargs.items()):
+                if isinstance(v, np.ndarray):
+                    v = "ndarray%s:%s:%s" % (v.shape, v.dtype, hashlib.sha1(np.ascontiguousarray(v).tobytes()).hexdigest())
+                elif not isinstance(v, (bool, int, float, str)):
+                    v = repr(v)
+                params[k] = v
+            steps.append([name, params])
+        return steps
+
 
 class CompositeBackgroundSubtractor:
     def __init__(self, *args):
@@ -71,3 +92,128 @@ class CompositeBackgroundSubtractor:
             fgmaskTot = np.maximum(fgmask, fgmaskTot)
         return fgmaskTot
 
+
+
+class RegionMask:
+    def __init__(self, includePolygons=None, excludePolygons=None, excludeMask=None):
+        """
+        RegionMask constructor: region of the frame where objects can be detected
+        :param includePolygons: list of polygons (each one a list of (x,y) points) that make up the region of interest; if None, the whole frame
+        :param excludePolygons: list of polygons (each one a list of (x,y) points) removed from the region of interest
+        :param excludeMask: b/w image whose non-zero pixels are removed from the region of interest (resized to the frame, if necessary)
+        Coordinates are those of the frames given to the detector.
+        """
+        self.includePolygons = includePolygons
+        self.excludePolygons = excludePolygons
+        self.excludeMask = excludeMask
+        self.shape = None
+        self.crop = None            # bounding rect (x,y,w,h) of the active region
+        self.maskCrop = None        # active region (255) inside the crop; None if the whole crop is active
+
+    def build(self, shape):
+        """
+        Rasterize the region for frames of the given shape (done only when the shape changes)
+        :param shape: shape of the frames
+        :return: bounding rect (x,y,w,h) of the active region
+        """
+        if self.shape == shape[:2]:
+            return self.crop
+        height, width = shape[:2]
+        if self.includePolygons is None:
+            mask = np.full((height, width), 255, dtype="uint8")
+        else:
+            mask = np.zeros((height, width), dtype="uint8")
+            cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32) for polygon in self.includePolygons], 255)
+        if self.excludePolygons is not None:
+            cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32) for polygon in self.excludePolygons], 0)
+        if self.excludeMask is not None:
+            excludeMask = self.excludeMask
+            if excludeMask.shape[:2] != (height, width):
+                excludeMask = cv2.resize(excludeMask, (width, height), interpolation=cv2.INTER_NEAREST)
+            mask[excludeMask != 0] = 0
+
+        x, y, w, h = cv2.boundingRect(mask)
+        self.shape = shape[:2]
+        self.crop = (x, y, w, h)
+        self.maskCrop = mask[y:y+h, x:x+w].copy()
+        if cv2.countNonZero(self.maskCrop) == w * h:
+            self.maskCrop = None    # nothing to zero inside the crop
+        return self.crop
+
+    def apply(self, fgmask):
+        """
+        Zero (in place) the pixels of a mask of the crop that are outside the active region
+        :param fgmask: b/w image of the size of the crop
+        :return: the same image
+        """
+        if self.maskCrop is not None:
+            cv2.bitwise_and(fgmask, self.maskCrop, dst=fgmask)
+        return fgmask
+
+    def signature(self):
+        """
+        :return: description of the region (JSON serializable)
+        """
+        excludeMask = None
+        if self.excludeMask is not None:
+            excludeMask = hashlib.sha1(np.ascontiguousarray(self.excludeMask).tobytes()).hexdigest()
+        return {
+            "include": [[list(map(int, p)) for p in polygon] for polygon in self.includePolygons] if self.includePolygons is not None else None,
+            "exclude": [[list(map(int, p)) for p in polygon] for polygon in self.excludePolygons] if self.excludePolygons is not None else None,
+            "excludeMask": excludeMask,
+        }
+
+
+def createBackgroundSubtractorFromSpec(spec):
+    """
+    Create a background subtractor from a picklable description of it (useful to create it inside another process)
+    :param spec: a tuple (name, params); name is one of "MOG", "MOG2", "GMG", "KNN" and params is a dictionary with the kwargs of the OpenCV constructor;
+                 for a CompositeBackgroundSubtractor, name is "Composite" and params is a list of specs
+    :return: the background subtractor
+    """
+    name, params = spec
+    if name == "Composite":
+        return CompositeBackgroundSubtractor(*[createBackgroundSubtractorFromSpec(s) for s in params])
+    if name == "MOG":
+        return cv2.bgsegm.createBackgroundSubtractorMOG(**params)
+    if name == "MOG2":
+        return cv2.createBackgroundSubtractorMOG2(**params)
+    if name == "GMG":
+        return cv2.bgsegm.createBackgroundSubtractorGMG(**params)
+    if name == "KNN":
+        return cv2.createBackgroundSubtractorKNN(**params)
+    raise ValueError("unknown background subtractor: " + str(name))
+
+
+def describeSpec(spec):
+    """
+    Short textual description of a background subtractor spec
+    :param spec: a tuple (name, params), as for createBackgroundSubtractorFromSpec
+    :return: a string like "KNN(history=500, dist2Threshold=500.0)"
+    """
+    name, params = spec
+    if name == "Composite":
+        return "Composite(" + ", ".join(describeSpec(s) for s in params) + ")"
+    return name + "(" + ", ".join("%s=%s" % (k, v) for k, v in params.items()) + ")"
+
+
+def describeBackgroundSubtractor(bgSubtractor):
+    """
+    Description of the type and of the parameters of a background subtractor (not of its state), obtained through its getters
+    :param bgSubtractor: a background subtractor (cv2.BackgroundSubtractor or CompositeBackgroundSubtractor)
+    :return: a dictionary (JSON serializable)
+    """
+    if isinstance(bgSubtractor, CompositeBackgroundSubtractor):
+        return {"name": "Composite", "bgSubtractors": [describeBackgroundSubtractor(b) for b in bgSubtractor.bgSubtractors]}
+    description = {"name": bgSubtractor.getDefaultName()}
+    for attr in sorted(dir(bgSubtractor)):
+        if not attr.startswith("get") or attr in ("getDefaultName", "getBackgroundImage"):
+            continue
+        try:
+            value = getattr(bgSubtractor, attr)()
+        except (cv2.error, TypeError):
+            continue    # not a parameter getter
+        if not isinstance(value, (bool, int, float, str)):
+            value = repr(value)
+        description[attr[3:]] = value
+    return description
@@ -1,43 +1,108 @@
+import threading
+import time
+
 import cv2
 import os
 
-# webcam
-cap = cv2.VideoCapture(0)
-
-# output file
-outputFile = "video/name_of_the_video.mp4"
-
-if os.path.exists(outputFile):
-    i = ""
-    while i != "n" and i != "y":
-        i = input("Do yuo want to overwrite file '" + outputFile + "'? (y/n)\n")
-    if i == "n":
-        exit(0)
-
-''' cycle begins '''
-width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-out = cv2.VideoWriter(outputFile, cv2.VideoWriter_fourcc(*'XVID'), 15, (width, height))
-show = True
-scale = 2
-while True:
-
-    ''' handle input '''
-    k = cv2.waitKey(30) & 0xff
-    if k == 27:
-        break
-    elif k == ord(' '):
-        show = not show
-    if not show:
-        continue
-
-    ''' reading next frame '''
-    ret, frame = cap.read()
-    cv2.imshow('frame', frame)
-
-    out.write(frame)
-
-cap.release()
-cv2.destroyAllWindows()
-out.release()
\ No newline at end of file
+from video_writer import AsyncVideoWriter
+
+"""
+Record a video from the webcam.
+Frames are captured by a dedicated thread and encoded by another one: neither a slow encoder nor the preview window delays the capture, and the capture time of each frame is saved alongside the video.
+"""
+
+
+def capture(cap, out, recording, stopped, last):
+    """
+    Body of the capture thread: frames are enqueued to the encoder as soon as they are read, the main thread only shows the last one
+    :param cap: video capture
+    :param out: AsyncVideoWriter where the frames are written
+    :param recording: event, cleared to pause the recording
+    :param stopped: event, set to stop the capture (the capture sets it too, when the stream ends)
+    :param last: dictionary where the last captured frame ("frame") and the number of captured frames ("count") are stored
+    """
+    while not stopped.is_set():
+        if not recording.wait(timeout=0.1):
+            continue
+        ret, frame = cap.read()
+        timestamp = time.time()
+        if not ret:
+            break
+        out.write(frame, timestamp)     # the frame is shared with the preview, none of them modifies it
+        last["frame"] = frame
+        last["count"] += 1
+    stopped.set()
+
+
+def main():
+    # webcam
+    cap = cv2.VideoCapture(0)
+
+    # output file
+    outputFile = "video/name_of_the_video.mp4"
+    timestampsFile = outputFile[:outputFile.rfind(".")] + "_timestamps.csv"
+
+    if os.path.exists(outputFile):
+        i = ""
+        while i != "n" and i != "y":
+            i = input("Do yuo want to overwrite file '" + outputFile + "'? (y/n)\n")
+        if i == "n":
+            exit(0)
+
+    ''' parameters '''
+    maxQueue = 64       # maximum number of frames waiting to be encoded
+    policy = "block"    # "block": wait for the encoder when the queue is full | "drop": discard the frame
+    preview = True      # show the captured frames (esc to stop, space to pause); without preview, stop with ctrl+c
+
+    ''' cycle begins '''
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    out = AsyncVideoWriter(outputFile, cv2.VideoWriter_fourcc(*'XVID'), 15, (width, height),
+                           maxQueue=maxQueue, policy=policy, timestampsFile=timestampsFile)
+    recording = threading.Event()
+    recording.set()
+    stopped = threading.Event()
+    last = {"frame": None, "count": 0}
+    captureThread = threading.Thread(target=capture, args=(cap, out, recording, stopped, last), daemon=True)
+    captureThread.start()
+
+    # the main thread only handles the preview (GUI functions must be called from the main thread)
+    shownFrames = 0
+    try:
+        while not stopped.is_set():
+
+            ''' handle input '''
+            if preview:
+                k = cv2.waitKey(30) & 0xff
+                if k == 27:
+                    break
+                elif k == ord(' '):
+                    if recording.is_set():
+                        recording.clear()
+                    else:
+                        recording.set()
+            else:
+                time.sleep(0.03)
+
+            ''' showing last frame '''
+            if preview and last["count"] != shownFrames:
+                shownFrames = last["count"]
+                cv2.imshow('frame', last["frame"])
+
+            print("\rCaptured: %05d    Queue: %02d    Dropped: %04d    " % (last["count"], out.queueDepth(), out.droppedFrames), end="")
+    except KeyboardInterrupt:
+        pass
+
+    stopped.set()
+    captureThread.join()
+    cap.release()
+    out.release()
+    if preview:
+        cv2.destroyAllWindows()
+    print("\rCaptured: %05d    Written: %05d    Dropped: %04d    Max queue: %02d" %
+          (last["count"], out.writtenFrames, out.droppedFrames, out.maxQueueDepth))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import multiprocessing as mp
+import queue
+import sys
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector
+from frame_ring import SharedFrameRing
+from object_detector import ObjectDetector
+from tracker import TrackerManager
+from utils import draw_bboxes
+
+"""
+Multi-process version of the loop of main_tracking: decoding, background subtraction, tracking and face detection run in separate processes, while rendering runs in the main one.
+Frames and masks are written once into a shared memory ring buffer and each stage reads them in place; only slot indexes and bounding boxes travel through the queues.
+A slot goes back to the decoder only after the renderer has shown it, so a slow stage blocks the decoder instead of filling the memory (backpressure).
+Every stage is a single process that consumes its queue in order, hence frames reach the renderer in the same order they were decoded.
+"""
+
+
+def _decodeStage(ring, captureSource, freeSlots, output, stopEvent):
+    """
+    Read frames from the input stream and write them (flipped and resized to the shape of the ring) into free slots of the ring
+    """
+    cap = cv2.VideoCapture(captureSource)
+    frameOrig = frame = None
+    frameNumber = 0
+    try:
+        while not stopEvent.is_set():
+            ret, decoded = cap.read()
+            if not ret:
+                break
+            slot = None
+            while slot is None and not stopEvent.is_set():
+                try:
+                    slot = freeSlots.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if slot is None:
+                break
+            frameOrig = ring.view(slot, "frameOrig")
+            frame = ring.view(slot, "frame")
+            cv2.flip(decoded, 1, dst=frameOrig)
+            cv2.resize(frameOrig, (frame.shape[1], frame.shape[0]), dst=frame, interpolation=cv2.INTER_AREA)
+            output.put((slot, frameNumber))
+            frameNumber += 1
+    finally:
+        output.put(None)
+        cap.release()
+        frameOrig = frame = None
+        ring.close()
+
+
+def _detectStage(ring, bgSubtractorFactory, pipelineFactory, period, regionMask, input, output):
+    """
+    Detect objects by background subtraction, writing the final mask into the ring
+    """
+    od = ObjectDetector(bgSubtractorFactory(), pipelineFactory(), regionMask=regionMask)
+    frame = mask = None
+    try:
+        for slot, frameNumber in iter(input.get, None):
+            frame = ring.view(slot, "frame")
+            mask = ring.view(slot, "mask")
+            detectedObjects = []
+            mask.fill(0)
+            if frameNumber % period == 0:
+                detectedObjects = od.detect(frame)
+                # with a region of interest, the mask of the detector covers only its bounding rect
+                x, y, w, h = regionMask.build(frame.shape) if regionMask is not None else (0, 0, frame.shape[1], frame.shape[0])
+                if w > 0 and h > 0:
+                    np.copyto(mask[y:y+h, x:x+w], od.pipeline.intermediateOutputs[-1])
+            output.put((slot, frameNumber, detectedObjects))
+    finally:
+        output.put(None)
+        frame = mask = None
+        ring.close()
+
+
+def _trackStage(ring, trackerName, maxFailures, maintainDetected, input, output):
+    """
+    Update the trackers, merging them with the detected objects
+    """
+    tm = TrackerManager(trackerName, maxFailures=maxFailures)
+    frame = None
+    try:
+        for slot, frameNumber, detectedObjects in iter(input.get, None):
+            frame = ring.view(slot, "frame")
+            success, objects = tm.update(frame, detectedObjects, maintainDetected=maintainDetected)
+            objIDs = tm.getIDs()
+            tm.removeDeadTrackers()
+            output.put((slot, frameNumber, success, objects, objIDs))
+    finally:
+        output.put(None)
+        frame = None
+        ring.close()
+
+
+def _faceStage(ring, outputDir, input, output):
+    """
+    Detect faces inside the successfully tracked objects; at the end, the best faces are saved on disk
+    """
+    fd = FaceDetector()
+    frameOrig = None
+    try:
+        for slot, frameNumber, success, objects, objIDs in iter(input.get, None):
+            frameOrig = ring.view(slot, "frameOrig")
+            frame = ring.view(slot, "frame")
+            scale = frameOrig.shape[1] / frame.shape[1]
+            frame = None
+            succ_objects = [obj for suc, obj in zip(success, objects) if suc]
+            faces_bboxes = fd.detectFaces(frameOrig, succ_objects, objIDs, scale=scale)
+            output.put((slot, frameNumber, success, objects, objIDs, faces_bboxes))
+    finally:
+        output.put(None)
+        frameOrig = None
+        try:
+            fd.dump(outputDir)
+        finally:
+            ring.close()
+
+
+class StagePipeline:
+
+    def __init__(self, captureSource, trackerName, bgSubtractorFactory, pipelineFactory, frameWidth=512, period=1,
+                 maintainDetected=True, maxFailures=20, regionMask=None, numSlots=8):
+        """
+        StagePipeline constructor
+        :param captureSource: input stream (as for cv2.VideoCapture)
+        :param trackerName: name of the tracker used by the TrackerManager
+        :param bgSubtractorFactory: function without arguments that creates the background subtractor (it is called inside the detection process); it must be picklable, e.g. a module level function
+        :param pipelineFactory: function without arguments that creates the ProcessPipeline; it must be picklable
+        :param frameWidth: width of the frames given to the detector and the trackers
+        :param period: length of the period: only on the first frame of the period we detect objects
+        :param maintainDetected: True to maintain detector's bounding boxes in case of overlaps with trackers' bounding boxes, False to maintain the latter
+        :param maxFailures: maximum number of consecutive failures of a tracker
+        :param regionMask: a RegionMask object, given to the detector (see ObjectDetector); None to search objects in the whole frame
+        :param numSlots: number of frames that can be in flight at the same time between the stages
+        """
+        self.captureSource = captureSource
+        self.trackerName = trackerName
+        self.bgSubtractorFactory = bgSubtractorFactory
+        self.pipelineFactory = pipelineFactory
+        self.frameWidth = frameWidth
+        self.period = period
+        self.maintainDetected = maintainDetected
+        self.maxFailures = maxFailures
+        self.regionMask = regionMask
+        self.numSlots = numSlots
+
+    def _frameShapes(self):
+        """
+        Read the first frame of the input stream to know the shapes of the arrays in the ring
+        :return: a tuple (shape of the original frame, shape of the resized frame), or None if the stream is empty
+        """
+        cap = cv2.VideoCapture(self.captureSource)
+        ret, frameOrig = cap.read()
+        cap.release()
+        if not ret:
+            return None
+        height, width = frameOrig.shape[:2]
+        frameHeight = int(height * (self.frameWidth / float(width)))    # as imutils.resize
+        return frameOrig.shape, (frameHeight, self.frameWidth, frameOrig.shape[2])
+
+    def run(self, outputDir, show=True, showMask=False):
+        """
+        Start the stage processes and render their output until the stream ends or esc is pressed
+        :param outputDir: directory where the faces are saved
+        :param show: True to show the annotated frames in a window
+        :param showMask: True to show also the foreground masks of the detector (read in place from the ring), in another window
+        :return: a tuple (number of rendered frames, elapsed time in seconds)
+        """
+        shapes = self._frameShapes()
+        if shapes is None:
+            return 0, 0
+        origShape, frameShape = shapes
+        ring = SharedFrameRing(self.numSlots, {
+            "frameOrig": (origShape, np.uint8),
+            "frame": (frameShape, np.uint8),
+            "mask": (frameShape[:2], np.uint8),
+        })
+
+        stopEvent = mp.Event()
+        freeSlots = mp.Queue()
+        for slot in range(self.numSlots):
+            freeSlots.put(slot)
+        decoded, detected, tracked, rendered = mp.Queue(), mp.Queue(), mp.Queue(), mp.Queue()
+        processes = [
+            mp.Process(target=_decodeStage, args=(ring, self.captureSource, freeSlots, decoded, stopEvent)),
+            mp.Process(target=_detectStage, args=(ring, self.bgSubtractorFactory, self.pipelineFactory, self.period, self.regionMask, decoded, detected)),
+            mp.Process(target=_trackStage, args=(ring, self.trackerName, self.maxFailures, self.maintainDetected, detected, tracked)),
+            mp.Process(target=_faceStage, args=(ring, outputDir, tracked, rendered)),
+        ]
+        for process in processes:
+            process.start()
+
+        frameNumber = 0
+        frames = 0
+        seconds = 0
+        eta = 0.05
+        start = timer()
+        last = start
+        try:
+            for slot, n, success, objects, objIDs, faces_bboxes in iter(rendered.get, None):
+                assert n == frameNumber, "frames out of order"
+                if show and not stopEvent.is_set():
+                    frameOrig = ring.view(slot, "frameOrig")
+                    scale = frameOrig.shape[1] / self.frameWidth
+                    failed_objects = [obj for suc, obj in zip(success, objects) if not suc]
+                    failed_objIDs = [objID for suc, objID in zip(success, objIDs) if not suc]
+                    succ_objIDs = [objID for suc, objID in zip(success, objIDs) if suc]
+                    objects = [obj for suc, obj in zip(success, objects) if suc]
+                    img = draw_bboxes(frameOrig, objects, (255,0,0), succ_objIDs, scale=scale)
+                    img = draw_bboxes(img, failed_objects, (0,0,255), failed_objIDs, scale=scale)
+                    img = draw_bboxes(img, faces_bboxes, (0,255,0))
+                    frameOrig = None
+                    cv2.imshow('frame', cv2.resize(img, (640, 640)))
+                    if showMask:
+                        cv2.imshow('mask', ring.view(slot, "mask"))
+                    if cv2.waitKey(1) & 0xff == 27:
+                        stopEvent.set()     # the stages are drained until the end, so that all of them terminate cleanly
+                freeSlots.put(slot)
+
+                frameNumber += 1
+                now = timer()
+                frames = eta + (1-eta)*frames
+                seconds = eta * (now-last) + (1-eta)*seconds
+                last = now
+                print("\rFrame: %04d    FPS: %03d   Active trackers: %02d           " %
+                      (frameNumber, int(frames // seconds), sum(success)), end="")
+        finally:
+            stopEvent.set()
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    sys.stderr.write("\nstage %s did not terminate\n" % process.name)
+                    process.terminate()
+            if show:
+                cv2.destroyAllWindows()
+            ring.close()
+
+        return frameNumber, timer() - start
@@ -0,0 +1,231 @@
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from timeit import default_timer as timer
+
+import cv2
+import imutils
+
+from face_detector import FaceDetector
+from object_detector import ObjectDetector
+from tracker import TrackerManager
+
+"""
+Engine that serves many input streams (cameras or video files) with a shared pool of workers.
+Every stream has its own detector, trackers (with their own identifiers) and faces archive, so the streams are completely independent.
+"""
+
+
+class Stream:
+
+    def __init__(self, name, captureSource, bgSubtractorFactory, pipelineFactory, trackerName="CSRT", frameWidth=512,
+                 period=1, maintainDetected=True, maxFailures=20, outputDir="output"):
+        """
+        Stream constructor: only the configuration is stored, the state is created by open() (so that a not opened stream can be sent to another process)
+        :param name: name of the stream, used as sub-folder of the output folder
+        :param captureSource: input stream (as for cv2.VideoCapture)
+        :param bgSubtractorFactory: function without arguments that creates the background subtractor of this stream
+        :param pipelineFactory: function without arguments that creates the ProcessPipeline of this stream
+        :param trackerName: name of the tracker used by the TrackerManager
+        :param frameWidth: width of the frames given to the detector and the trackers
+        :param period: length of the period: only on the first frame of the period we detect objects
+        :param maintainDetected: True to maintain detector's bounding boxes in case of overlaps with trackers' bounding boxes, False to maintain the latter
+        :param maxFailures: maximum number of consecutive failures of a tracker
+        :param outputDir: folder where the faces of all the streams are saved
+        """
+        self.name = name
+        self.captureSource = captureSource
+        self.bgSubtractorFactory = bgSubtractorFactory
+        self.pipelineFactory = pipelineFactory
+        self.trackerName = trackerName
+        self.frameWidth = frameWidth
+        self.period = period
+        self.maintainDetected = maintainDetected
+        self.maxFailures = maxFailures
+        self.outputDir = os.path.join(outputDir, name, trackerName)
+
+        self.cap = None
+        self.od = None
+        self.tm = None
+        self.fd = None
+        self.frameNumber = 0
+        self.busyTime = 0
+        self.error = None   # description of the error that stopped the stream, if any
+
+    def open(self):
+        """
+        Open the input stream and create detector, trackers manager and face detector of this stream
+        :return: reference of self
+        """
+        self.cap = cv2.VideoCapture(self.captureSource)
+        self.od = ObjectDetector(self.bgSubtractorFactory(), self.pipelineFactory())
+        self.tm = TrackerManager(self.trackerName, maxFailures=self.maxFailures)
+        self.fd = FaceDetector()
+        return self
+
+    def step(self):
+        """
+        Process the next frame of the stream: detection, tracking and face detection
+        :return: False if the stream has ended, True otherwise
+        """
+        start = timer()
+        ret, frameOrig = self.cap.read()
+        if not ret:
+            return False
+        frameOrig = cv2.flip(frameOrig, 1)
+        frame = imutils.resize(frameOrig, width=self.frameWidth)
+        scale = frameOrig.shape[1] / self.frameWidth
+
+        detectedObjects = []
+        if self.frameNumber % self.period == 0:
+            detectedObjects = self.od.detect(frame)
+
+        success, objects = self.tm.update(frame, detectedObjects, maintainDetected=self.maintainDetected)
+        objIDs = self.tm.getIDs()
+        self.tm.removeDeadTrackers()
+
+        objects = [obj for suc, obj in zip(success, objects) if suc]
+        self.fd.detectFaces(frameOrig, objects, objIDs, scale=scale)
+
+        self.frameNumber += 1
+        self.busyTime += timer() - start
+        return True
+
+    def close(self):
+        """
+        Release the input stream and save the faces on disk (also after an error, the faces found until then are saved)
+        """
+        if self.cap is not None:
+            self.cap.release()
+        if self.fd is not None:
+            self.fd.dump(self.outputDir)
+
+    def fail(self, exception):
+        """
+        Record and log the error that stopped this stream; the other streams keep being served
+        :param exception: the exception raised by the stream
+        """
+        self.error = "%s: %s" % (type(exception).__name__, exception)
+        sys.stderr.write("\nstream %s stopped at frame %d:\n%s" %
+                         (self.name, self.frameNumber, "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))))
+
+    def stats(self):
+        """
+        Statistics of the stream
+        :return: a dictionary with name, processed frames, processing time (in seconds) and error (None if the stream ended normally) of the stream
+        """
+        return {"name": self.name, "frames": self.frameNumber, "seconds": self.busyTime, "error": self.error}
+
+
+def _open(stream):
+    """
+    Open a stream; if it fails, the stream is closed
+    :return: True if the stream has been opened
+    """
+    try:
+        stream.open()
+        return True
+    except Exception as e:
+        stream.fail(e)
+        _close(stream)
+        return False
+
+
+def _close(stream):
+    """
+    Close a stream, recording the error if closing it fails
+    """
+    try:
+        stream.close()
+    except Exception as e:
+        stream.fail(e)
+
+
+def _runStreams(streams):
+    """
+    Serve some streams in the same process, one frame per stream in turn (round robin); a stream that raises an error is closed, the others go on
+    :param streams: list of not opened streams
+    :return: list of statistics of the streams
+    """
+    cv2.setNumThreads(1)    # parallelism is given by the processes
+    active = [stream for stream in streams if _open(stream)]
+    while active:
+        stillActive = []
+        for stream in active:
+            try:
+                running = stream.step()
+            except Exception as e:
+                stream.fail(e)
+                running = False
+            if running:
+                stillActive.append(stream)
+            else:
+                _close(stream)
+        active = stillActive
+    return [stream.stats() for stream in streams]
+
+
+class StreamEngine:
+
+    def __init__(self, streams, workers=None, mode="thread"):
+        """
+        StreamEngine constructor
+        :param streams: list of streams (of class Stream) to be served
+        :param workers: number of workers of the pool (if None, the number of cores)
+        :param mode: "thread" to use a pool of threads (OpenCV releases the GIL while processing), "process" to use a pool of processes (each stream is assigned to one of them)
+        """
+        assert mode in ("thread", "process")
+        assert len(set(stream.name for stream in streams)) == len(streams), "stream names must be unique"
+        self.streams = streams
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.mode = mode
+
+    def run(self):
+        """
+        Process all the streams until they end
+        :return: a tuple (list of statistics of the streams, elapsed time in seconds)
+        """
+        start = timer()
+        if self.mode == "thread":
+            stats = self._runThreads()
+        else:
+            stats = self._runProcesses()
+        return stats, timer() - start
+
+    def _runThreads(self):
+        """
+        Each stream has at most one frame in progress, so its state is never accessed concurrently; a stream that has processed a frame is put back at the end of the pool's queue, so streams are served fairly.
+        A stream that raises an error is closed, the others go on
+        :return: list of statistics of the streams
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(stream.step): stream for stream in self.streams if _open(stream)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stream = pending.pop(future)
+                    try:
+                        running = future.result()
+                    except Exception as e:
+                        stream.fail(e)
+                        running = False
+                    if running:
+                        pending[pool.submit(stream.step)] = stream
+                    else:
+                        _close(stream)
+        return [stream.stats() for stream in self.streams]
+
+    def _runProcesses(self):
+        """
+        Streams are partitioned among the processes, each process serves its streams in round robin
+        :return: list of statistics of the streams
+        """
+        workers = min(self.workers, len(self.streams))
+        if workers == 0:
+            return []
+        partitions = [self.streams[w::workers] for w in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_runStreams, partitions))
+        stats = {s["name"]: s for partitionStats in results for s in partitionStats}
+        return [stats[stream.name] for stream in self.streams]
@@ -0,0 +1,171 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+
+import cv2
+import numpy as np
+
+from frame_cache import CachedVideo, FrameCache
+from object_detector import ObjectDetector
+from preprocess import createBackgroundSubtractorFromSpec, describeSpec
+
+"""
+Parameter sweep of the object detector: every configuration (background subtractor + pipeline) is evaluated on the whole video in its own worker process,
+so each one keeps its own background model and the configurations run in parallel.
+The frames are decoded once in the frame cache, and every worker maps the same file.
+"""
+
+
+class SweepConfig:
+    def __init__(self, bgSubtractorSpec, pipelineName, pipeline, minArea=0.1, maxArea=0.5):
+        """
+        SweepConfig constructor
+        :param bgSubtractorSpec: spec of the background subtractor, as for createBackgroundSubtractorFromSpec
+        :param pipelineName: name of the pipeline, shown in the results
+        :param pipeline: a ProcessPipeline object
+        :param minArea: minArea parameter of ObjectDetector.detect
+        :param maxArea: maxArea parameter of ObjectDetector.detect
+        """
+        self.bgSubtractorSpec = bgSubtractorSpec
+        self.pipelineName = pipelineName
+        self.pipeline = pipeline
+        self.minArea = minArea
+        self.maxArea = maxArea
+
+
+def loadReferenceMask(referenceDir, frameNumber, shape):
+    """
+    Load the reference (ground truth) mask of a frame, if it exists
+    :param referenceDir: folder with the reference masks, one b/w image for each annotated frame, named as "%05d.png" % frameNumber
+    :param frameNumber: index of the frame
+    :param shape: shape (height, width) of the masks to compare with
+    :return: a boolean mask (True for foreground), or None if the frame has no reference
+    """
+    path = os.path.join(referenceDir, "%05d.png" % frameNumber)
+    if not os.path.exists(path):
+        return None
+    mask = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if mask.shape != shape:
+        mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask > 127
+
+
+def _evaluate(cachePath, config, referenceDir):
+    """
+    Evaluate one configuration on all the frames of a cached video (executed in a worker process)
+    :return: a dictionary with the results of the configuration
+    """
+    cv2.setNumThreads(1)    # parallelism is given by the processes
+    video = CachedVideo(cachePath)
+    od = ObjectDetector(createBackgroundSubtractorFromSpec(config.bgSubtractorSpec), config.pipeline)
+
+    frames = 0
+    detections = 0
+    framesWithDetections = 0
+    ious = []
+    start = timer()
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            break
+        objects = od.detect(frame, minArea=config.minArea, maxArea=config.maxArea)
+        detections += len(objects)
+        framesWithDetections += len(objects) > 0
+        if referenceDir is not None:
+            reference = loadReferenceMask(referenceDir, frames, frame.shape[:2])
+            if reference is not None:
+                mask = od.pipeline.intermediateOutputs[-1] > 0
+                union = np.count_nonzero(mask | reference)
+                ious.append(np.count_nonzero(mask & reference) / union if union > 0 else 1.0)
+        frames += 1
+    seconds = timer() - start
+    video.release()
+
+    return {
+        "subtractor": describeSpec(config.bgSubtractorSpec),
+        "pipeline": config.pipelineName,
+        "frames": frames,
+        "fps": frames / seconds if seconds > 0 else 0,
+        "detections per frame": detections / frames if frames > 0 else 0,
+        "frames with detections": framesWithDetections,
+        "mask IoU": float(np.mean(ious)) if ious else None,
+        "annotated frames": len(ious),
+    }
+
+
+class ParameterSweep:
+
+    def __init__(self, captureSource, frameWidth=512, flip=True, workers=None, referenceDir=None):
+        """
+        ParameterSweep constructor
+        :param captureSource: path of the video file
+        :param frameWidth: width of the frames given to the detectors
+        :param flip: True to flip horizontally the frames (as the main scripts do)
+        :param workers: number of worker processes (if None, the number of cores)
+        :param referenceDir: folder with reference masks (see loadReferenceMask); if None, mask agreement is not computed
+        """
+        self.captureSource = captureSource
+        self.frameWidth = frameWidth
+        self.flip = flip
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.referenceDir = referenceDir
+
+    @staticmethod
+    def grid(bgSubtractorSpecs, pipelines, minAreas=(0.1,), maxAreas=(0.5,)):
+        """
+        Create all the combinations of the given parameters
+        :param bgSubtractorSpecs: list of background subtractor specs
+        :param pipelines: dictionary of pipelines; key=name; value=ProcessPipeline object
+        :param minAreas: values of minArea to try
+        :param maxAreas: values of maxArea to try
+        :return: list of configurations (of class SweepConfig)
+        """
+        return [SweepConfig(spec, name, pipelines[name], minArea, maxArea)
+                for spec, name, minArea, maxArea in itertools.product(bgSubtractorSpecs, pipelines, minAreas, maxAreas)]
+
+    def run(self, configs):
+        """
+        Evaluate all the configurations in parallel
+        :param configs: list of configurations (of class SweepConfig)
+        :return: list of results (dictionaries), in the same order of configs
+        """
+        video = FrameCache().open(self.captureSource, width=self.frameWidth, flip=self.flip)    # decode once, before the workers start
+        cachePath = video.path
+        video.release()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(_evaluate, cachePath, config, self.referenceDir) for config in configs]
+            results = [future.result() for future in futures]
+        for config, result in zip(configs, results):
+            result["minArea"] = config.minArea
+            result["maxArea"] = config.maxArea
+        return results
+
+
+def printResults(results):
+    """
+    Print the results as a table
+    :param results: list of results returned by ParameterSweep.run
+    """
+    print("%-60s %-12s %7s %7s %10s %10s %8s" % ("subtractor", "pipeline", "minArea", "FPS", "det/frame", "det frames", "IoU"))
+    for r in results:
+        iou = "-" if r["mask IoU"] is None else "%.3f" % r["mask IoU"]
+        print("%-60s %-12s %7.2f %7.1f %10.2f %10d %8s" %
+              (r["subtractor"][:60], r["pipeline"][:12], r["minArea"], r["fps"], r["detections per frame"], r["frames with detections"], iou))
+
+
+def writeResults(results, path):
+    """
+    Write the results in a CSV file
+    :param results: list of results returned by ParameterSweep.run
+    :param path: path of the CSV file
+    """
+    if not results:
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from face_detector import FaceDetector, sharpnessScores
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope="module")
+def faces():
+    """
+    Faces found by the face detector in a video of the repository, with their widths
+    """
+    cwd = os.getcwd()
+    os.chdir(ROOT)     # the cascade is loaded from the working directory
+    try:
+        fd = FaceDetector()
+        cap = cv2.VideoCapture(os.path.join("video", "video_205.mp4"))
+        grays, widths = [], []
+        frameNumber = 0
+        while len(grays) < 30:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frameNumber += 1
+            if frameNumber % 5 == 0:
+                _, g, bboxes = fd._findFaces(frame)
+                grays.extend(g)
+                widths.extend(w for (x, y, w, h) in bboxes)
+        cap.release()
+    finally:
+        os.chdir(cwd)
+    if len(grays) < 15:
+        pytest.skip("not enough faces found in the video")
+    return grays, np.array(widths, dtype=np.float64)
+
+
+def test_sharpness_matches_reference(faces):
+    grays, widths = faces
+    reference = np.array([cv2.Laplacian(gray, cv2.CV_64F).var() for gray in grays])
+    scores = sharpnessScores(grays)
+    np.testing.assert_allclose(scores, reference, rtol=1e-9)
+
+    # faces are ranked by sharpness * width^1.5, as in FaceDetector
+    assert (np.argsort(-scores * widths**1.5, kind="stable") == np.argsort(-reference * widths**1.5, kind="stable")).all()
+
+
+def test_sharpness_of_different_sizes():
+    rng = np.random.RandomState(0)
+    grays = [rng.randint(0, 256, (h, w), dtype=np.uint8) for h, w in [(24, 24), (90, 90), (37, 150), (200, 31)]]
+    reference = np.array([cv2.Laplacian(gray, cv2.CV_64F).var() for gray in grays])
+    np.testing.assert_allclose(sharpnessScores(grays), reference, rtol=1e-9)
+    assert sharpnessScores([]).shape == (0,)
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import pickle
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from frame_ring import SharedFrameRing
+
+
+FIELDS = {"frame": ((4, 6, 3), np.uint8), "mask": ((4, 6), np.uint8)}
+
+
+def _fill(ring, slot, value):
+    ring.view(slot, "frame")[:] = value
+    ring.view(slot, "mask")[:] = value + 1
+    ring.close()
+
+
+def _shmExists(name):
+    return os.path.exists("/dev/shm/" + name.lstrip("/"))
+
+
+@pytest.mark.parametrize("method", [m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()])
+def test_round_trip(method):
+    ring = SharedFrameRing(3, FIELDS)
+    name = ring.shm.name
+    try:
+        ctx = multiprocessing.get_context(method)
+        p = ctx.Process(target=_fill, args=(ring, 1, 7))
+        p.start()
+        p.join()
+        assert p.exitcode == 0
+
+        # the child closed its handle, the block is still alive and holds what the child wrote
+        assert (ring.view(1, "frame") == 7).all()
+        assert (ring.view(1, "mask") == 8).all()
+        assert (ring.view(0, "frame") == 0).all()
+    finally:
+        ring.close()
+    if os.path.isdir("/dev/shm"):
+        assert not _shmExists(name)
+
+
+def test_pickle_attaches_to_the_same_block():
+    ring = SharedFrameRing(2, FIELDS)
+    try:
+        other = pickle.loads(pickle.dumps(ring))
+        assert other.shm.name == ring.shm.name
+        assert other.ownerPid is None
+        other.view(0, "mask")[2, 3] = 42
+        assert ring.view(0, "mask")[2, 3] == 42
+        other.close()
+        assert (ring.view(1, "frame").ctypes.data - ring.view(0, "frame").ctypes.data) % SharedFrameRing.ALIGNMENT == 0
+    finally:
+        ring.close()
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from stream_engine import Stream, StreamEngine
+
+
+class CountingStream(Stream):
+    """
+    Stream without video: it processes numFrames frames, or raises an error at frame failAt
+    """
+
+    def __init__(self, name, numFrames, failAt=None):
+        super().__init__(name, None, None, None)
+        self.numFrames = numFrames
+        self.failAt = failAt
+        self.closed = False
+
+    def open(self):
+        return self
+
+    def step(self):
+        if self.frameNumber == self.failAt:
+            raise RuntimeError("broken camera")
+        if self.frameNumber == self.numFrames:
+            return False
+        self.frameNumber += 1
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_failing_stream_does_not_stop_the_others(mode):
+    streams = [CountingStream("a", 50), CountingStream("b", 50, failAt=10), CountingStream("c", 30)]
+    stats, _ = StreamEngine(streams, workers=2, mode=mode).run()
+    stats = {s["name"]: s for s in stats}
+    assert stats["a"]["frames"] == 50 and stats["a"]["error"] is None
+    assert stats["c"]["frames"] == 30 and stats["c"]["error"] is None
+    assert stats["b"]["frames"] == 10 and "broken camera" in stats["b"]["error"]
+    if mode == "thread":
+        assert all(stream.closed for stream in streams)
@@ -0,0 +1,26 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from video_writer import AsyncVideoWriter
+
+
+def test_frames_and_timestamps_are_written(tmp_path):
+    out = AsyncVideoWriter(str(tmp_path / "out.avi"), cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48),
+                           maxQueue=2, timestampsFile=str(tmp_path / "out.csv"))
+    for i in range(20):
+        out.write(np.full((96, 128, 3), i, dtype=np.uint8), timestamp=float(i))     # resized by the encoder
+    out.release()
+    assert out.writtenFrames == 20 and out.error is None
+    assert len((tmp_path / "out.csv").read_text().splitlines()) == 21
+
+
+def test_encoder_error_is_raised_instead_of_blocking(tmp_path):
+    out = AsyncVideoWriter(str(tmp_path / "out.avi"), cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48), maxQueue=1, policy="block")
+    out.write(np.zeros((0, 0, 3), dtype=np.uint8))      # cv2.resize fails on an empty frame
+    with pytest.raises(cv2.error):
+        for i in range(100):    # with the "block" policy, a dead encoder would block here forever
+            out.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    with pytest.raises(cv2.error):
+        out.release()
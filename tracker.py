@@ -17,8 +17,10 @@ class Tracker:
         self.tracker = tracker
         self.numFailures = 0
         self.eps = eps
+        self.initBBox = None
         self.lastBBox = None
         self.lastSuccess = None
+        self.lostFrames = 0     # frames elapsed since the last successful update
         if id is None:
             self.id = Tracker.nextID
             Tracker.nextID += 1
@@ -33,31 +35,58 @@ class Tracker:
         :return: True if initialization went successfully, False otherwise
         """
         self.position = obj_bbox[0] + obj_bbox[2] // 2, obj_bbox[1] + obj_bbox[3] // 2  # x+w//2, y+h//2
+        self.speed = (0, 0)
+        self.initBBox = list(obj_bbox)
         return self.tracker.init(frame, obj_bbox)
 
-    def update(self, frame):
+    def update(self, frame, skippedFrames=0):
         """
         Update the tracker, finding the new most likely bounding box for the target
         :param frame: the frame where to search for the object
+        :param skippedFrames: number of frames dropped since the previous update (the speed is normalized w.r.t. them)
         :return: a tuple (s, b); s is a boolean that indicates if target has been successfully located; b is bounding box that represent the new target location, if s=True was returned
         """
+        elapsed = self.lostFrames + skippedFrames + 1   # frames since the last known position
         s, b = self.tracker.update(frame)
         b = [int(max([k, 0])) for k in b]
         b[0] = min(b[0], frame.shape[1]-1)           # x < frame_width
         b[1] = min(b[1], frame.shape[0]-1)           # y < frame_height
         b[2] = min(b[2], frame.shape[1]-1-b[0])      # w < frame_width - x
         b[3] = min(b[3], frame.shape[0]-1-b[1])      # h < frame_height - y
-        position = b[0] + b[2]//2, b[1] + b[3]//2    # x+w//2, y+h//2
-        self.speed = (position[0]-self.position[0], position[1]-self.position[1])
         if not s:
+            # the returned bounding box is meaningless: keep the last known position and speed
             self.numFailures += 1
-        elif abs(self.speed[0]) <= self.eps and abs(self.speed[1]) <= self.eps:
+            self.lostFrames = elapsed
+            return s, b
+        position = b[0] + b[2]//2, b[1] + b[3]//2    # x+w//2, y+h//2
+        self.speed = ((position[0]-self.position[0]) / elapsed, (position[1]-self.position[1]) / elapsed)
+        self.lostFrames = 0
+        if abs(self.speed[0]) <= self.eps and abs(self.speed[1]) <= self.eps:
             self.numFailures += 2
         else:
             self.numFailures = 0
         self.position = position
         return s, b
 
+    def extrapolate(self, bbox, numFrames, frame_shape):
+        """
+        Move a bounding box according to the last known speed of the object (constant velocity motion model)
+        :param bbox: bounding box (as (x,y,w,h)) to be moved
+        :param numFrames: number of frames over which the motion is extrapolated
+        :param frame_shape: shape of the frame, the moved bounding box is kept inside it
+        :return: the moved bounding box
+        """
+        if self.speed is None or numFrames <= 0:
+            return bbox
+        x, y, w, h = bbox
+        x = int(round(x + self.speed[0] * numFrames))
+        y = int(round(y + self.speed[1] * numFrames))
+        x = max(min(x, frame_shape[1]-1-w), 0)     # the box stops at the border of the frame, keeping its size
+        y = max(min(y, frame_shape[0]-1-h), 0)
+        w = min(w, frame_shape[1]-1-x)
+        h = min(h, frame_shape[0]-1-y)
+        return [x, y, w, h]
+
 
 class TrackerManager:
     def __init__(self, nameDefaultTracker, maxFailures=80):
@@ -69,6 +98,7 @@ class TrackerManager:
         self.trackers = []
         self.nameDefaultTracker = nameDefaultTracker
         self.maxFailures = maxFailures
+        self.nextID = 0     # identifiers are assigned per manager, so that managers of different streams do not collide
 
     def addTracker(self, frame, obj_bbox, trackerName=None):
         """
@@ -81,31 +111,34 @@ class TrackerManager:
         if trackerName is None:
             trackerName = self.nameDefaultTracker
         if trackerName == "MOSSE":
-            tracker = Tracker(cv2.TrackerMOSSE_create())
+            tracker = Tracker(cv2.TrackerMOSSE_create(), id=self.nextID)
         elif trackerName == "KCF":
-            tracker = Tracker(cv2.TrackerKCF_create())
+            tracker = Tracker(cv2.TrackerKCF_create(), id=self.nextID)
         elif trackerName == "CSRT":
-            tracker = Tracker(cv2.TrackerCSRT_create())
+            tracker = Tracker(cv2.TrackerCSRT_create(), id=self.nextID)
         else:
             print("unknown tracker")
             exit(1)
 
+        self.nextID += 1
         tracker.init(frame, obj_bbox)
         self.trackers.append(tracker)
         return tracker
 
-    def _update(self, frame):
+    def _update(self, frame, skippedFrames=0):
         """
         Updates all trackers on the given frame. No merge with detection is considered here.
         :param frame: the frame where to search for the objects
+        :param skippedFrames: number of frames dropped since the previous update; lost objects are moved along their last known motion, for all the frames elapsed since they were lost
         :return: a tuple of lists (ls, lb); ls is a list of boolean (True if the object is successfully located); lb is a list of bounding boxes, each of them represents an object's location
         """
         successes = []
         bboxes = []
         for i, tracker in enumerate(self.trackers):
-            s, b = tracker.update(frame)
-            if not s and b == [0,0,0,0] and tracker.lastBBox is not None:
-                b = tracker.lastBBox
+            s, b = tracker.update(frame, skippedFrames)
+            if not s:
+                # lastBBox is the last successful bounding box: consecutive failures keep moving the object away from it
+                b = tracker.extrapolate(tracker.lastBBox if tracker.lastBBox is not None else tracker.initBBox, tracker.lostFrames, frame.shape)
             else:
                 tracker.lastBBox = b
             tracker.lastSuccess = s
@@ -118,15 +151,16 @@ class TrackerManager:
         
         return successes, bboxes
 
-    def update(self, frame, detectedObjects=None, maintainDetected=True):
+    def update(self, frame, detectedObjects=None, maintainDetected=True, skippedFrames=0):
         """
         Updates all trackers on the given frame. Eventually merge with detection.
         :param frame: the frame where to search for the objects
         :param detectedObjects: the list of bounding boxes (as (x,y,w,h)) given by an external object detector
         :param maintainDetected: True to maintain detector's bounding boxes in case of overlaps with trackers' bounding boxes, False to maintain the latter
+        :param skippedFrames: number of frames dropped since the previous update (e.g. by a real-time frame grabber)
         :return: a tuple of lists (ls, lb); ls is a list of boolean (True if the object is successfully located); lb is a list of bounding boxes, each of them represents an object's location
         """
-        successes, bboxes = self._update(frame)  # update all trackers (without merging bounding boxes)
+        successes, bboxes = self._update(frame, skippedFrames)  # update all trackers (without merging bounding boxes)
 
         if detectedObjects is not None and detectedObjects != []:
             trkIDs = self.getIDs()   # get the IDs of tracked objects
@@ -144,6 +178,21 @@ class TrackerManager:
                         self.reinitTracker(objID, frame, bbox)
         return successes, bboxes
 
+    def age(self, numFrames=1):
+        """
+        Lightweight alternative to update, for frames where nothing has changed: trackers are not run, objects keep their last bounding box and age as still objects
+        :param numFrames: number of frames elapsed since the previous update
+        :return: a tuple of lists (ls, lb), as update
+        """
+        successes = []
+        bboxes = []
+        for tracker in self.trackers:
+            tracker.speed = (0, 0)
+            tracker.numFailures += 2 * numFrames     # as in Tracker.update, for an object that is not moving
+            successes.append(tracker.lastSuccess if tracker.lastSuccess is not None else True)
+            bboxes.append(tracker.lastBBox if tracker.lastBBox is not None else tracker.initBBox)
+        return successes, bboxes
+
     def mergeBBoxes(self, trkSuccesses, trackedObjects, detectedObjects, threshold=0.2, trkIDs=None, maintainDetected=True):
         """
         Merge trackers' and detector's bounding boxes, resolving the conflicts (overlaps)
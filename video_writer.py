@@ -0,0 +1,92 @@
+import queue
+import threading
+
+import cv2
+
+
+class AsyncVideoWriter:
+
+    POLICIES = ("block", "drop")
+
+    def __init__(self, outputFile, fourcc, fps, frameSize, maxQueue=64, policy="block", timestampsFile=None):
+        """
+        AsyncVideoWriter constructor: frames are encoded by a dedicated thread, fed by a bounded queue, so that encoding does not delay the producer
+        :param outputFile: path of the output video
+        :param fourcc: codec (e.g. cv2.VideoWriter_fourcc(*'XVID'))
+        :param fps: frame rate of the output video
+        :param frameSize: size (width, height) of the output video; frames of different size are resized by the encoder thread
+        :param maxQueue: maximum number of frames waiting to be encoded
+        :param policy: what to do when the queue is full: "block" waits for the encoder, "drop" discards the frame
+        :param timestampsFile: path of a CSV file where, for each encoded frame, its index and timestamp are written (if None, they are not written)
+        """
+        assert policy in AsyncVideoWriter.POLICIES
+        self.writer = cv2.VideoWriter(outputFile, fourcc, fps, frameSize)
+        self.frameSize = tuple(frameSize)
+        self.policy = policy
+        self.queue = queue.Queue(maxsize=maxQueue)
+        self.timestampsFile = open(timestampsFile, "w") if timestampsFile is not None else None
+        if self.timestampsFile is not None:
+            self.timestampsFile.write("frame,timestamp\n")
+
+        self.writtenFrames = 0      # frames encoded
+        self.droppedFrames = 0      # frames discarded because the queue was full
+        self.maxQueueDepth = 0      # maximum number of frames waiting in the queue
+        self.error = None           # exception raised by the encoder thread, re-raised by write and release
+
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, timestamp=None):
+        """
+        Enqueue a frame to be encoded; the frame must not be modified afterwards
+        :param frame: BGR image
+        :param timestamp: capture time of the frame (e.g. time.time()), written in the timestamps file
+        :return: True if the frame has been enqueued, False if it has been dropped
+        """
+        if self.error is not None:
+            raise self.error
+        if self.policy == "block":
+            self.queue.put((frame, timestamp))
+        else:
+            try:
+                self.queue.put_nowait((frame, timestamp))
+            except queue.Full:
+                self.droppedFrames += 1
+                return False
+        self.maxQueueDepth = max(self.maxQueueDepth, self.queue.qsize())
+        return True
+
+    def queueDepth(self):
+        """
+        :return: number of frames waiting to be encoded
+        """
+        return self.queue.qsize()
+
+    def _encode(self):
+        """
+        Body of the encoder thread; after an error, the queue is still drained (without encoding), so that producers and release never block
+        """
+        for frame, timestamp in iter(self.queue.get, None):
+            if self.error is not None:
+                continue
+            try:
+                if (frame.shape[1], frame.shape[0]) != self.frameSize:
+                    frame = cv2.resize(frame, self.frameSize)
+                self.writer.write(frame)
+                if self.timestampsFile is not None:
+                    self.timestampsFile.write("%d,%s\n" % (self.writtenFrames, "" if timestamp is None else "%.6f" % timestamp))
+                self.writtenFrames += 1
+            except Exception as e:
+                self.error = e
+
+    def release(self):
+        """
+        Encode all the enqueued frames, then close the output video; if the encoder thread has failed, its error is raised (after closing the files)
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.release()
+        if self.timestampsFile is not None:
+            self.timestampsFile.close()
+        if self.error is not None:
+            raise self.error